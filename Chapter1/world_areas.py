@@ -1,4 +1,5 @@
 from __future__ import print_function
+import heapq
 from operator import itemgetter
 from osgeo import osr, ogr
 
@@ -68,19 +69,17 @@ def get_country_names(datasource):
 
 def get_biggest_countries(countries, areas, elements=5):
     """Returns a list of n countries sorted by area size."""
-    countries_list = [list(country)
-                      for country in zip(areas, countries)]
+    # A heap keeps only the n biggest, no need to sort them all.
+    return heapq.nlargest(elements, zip(areas, countries),
+                          key=itemgetter(0))
 
-    sorted_countries = sorted(countries_list,
-                              key=itemgetter(0), reverse=True)
-    return sorted_countries[:5]
 
-
-datasource = open_shapefile("../data/world_borders_simple.shp")
-transformed_geoms = transform_geometries(datasource, 4326, 3395)
-country_names = get_country_names(datasource)
-country_areas = calculate_areas(transformed_geoms)
-biggest_countries = get_biggest_countries(country_names,
-                                          country_areas)
-for item in biggest_countries:
-    print("{}\t{}".format(item[0], item[1]))
+if __name__ == '__main__':
+    datasource = open_shapefile("../data/world_borders_simple.shp")
+    transformed_geoms = transform_geometries(datasource, 4326, 3395)
+    country_names = get_country_names(datasource)
+    country_areas = calculate_areas(transformed_geoms)
+    biggest_countries = get_biggest_countries(country_names,
+                                              country_areas)
+    for item in biggest_countries:
+        print("{}\t{}".format(item[0], item[1]))
@@ -0,0 +1,75 @@
+# coding=utf-8
+# Run from the Chapter6 directory:
+#     python -m experiments.mercator_experiments
+
+import time
+
+import numpy as np
+from osgeo import osr
+
+from utils.geo_functions import get_fast_transform, transform_coordinates
+from utils.mercator import world_mercator, web_mercator
+
+# Maximum difference from OSR, in meters.
+TOLERANCE = 1e-3
+
+# Random WGS84 coordinates, avoiding the poles.
+count = 1000000
+lon = np.random.uniform(-180, 180, count)
+lat = np.random.uniform(-85, 85, count)
+lon_lat = np.column_stack((lon, lat))
+
+
+def max_difference(points, osr_points):
+    points = np.asarray(points)
+    osr_points = np.asarray(osr_points)
+    return np.hypot(points[:, 0] - osr_points[:, 0],
+                    points[:, 1] - osr_points[:, 1]).max()
+
+
+for epsg, projection in [(3395, world_mercator), (3857, web_mercator)]:
+    src_srs = osr.SpatialReference()
+    src_srs.ImportFromEPSG(4326)
+    src_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    dst_srs = osr.SpatialReference()
+    dst_srs.ImportFromEPSG(epsg)
+    dst_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transformation = osr.CoordinateTransformation(src_srs, dst_srs)
+
+    start = time.time()
+    osr_points = np.array(transformation.TransformPoints(lon_lat))
+    osr_time = time.time() - start
+
+    start = time.time()
+    x, y = projection(lon, lat)
+    numpy_time = time.time() - start
+
+    difference = max_difference(np.column_stack((x, y)), osr_points)
+    print('EPSG:4326 -> EPSG:{}'.format(epsg))
+    print('\tMax difference: {:.6f}mm'.format(difference * 1000))
+    print('\tOSR: {:.3f}s\tNumPy: {:.3f}s'.format(osr_time, numpy_time))
+    assert difference < TOLERANCE
+
+    # Coordinates from shapely are (lon, lat) whatever the EPSG
+    # axis order is.
+    points = transform_coordinates(lon_lat, 4326, epsg,
+                                   traditional_gis_order=True)
+    assert max_difference(points, osr_points) < TOLERANCE
+
+    # With the authority order, the fast path must take the
+    # coordinates in the same order as OSR does.
+    authority_src = osr.SpatialReference()
+    authority_src.ImportFromEPSG(4326)
+    authority_dst = osr.SpatialReference()
+    authority_dst.ImportFromEPSG(epsg)
+    authority_transformation = osr.CoordinateTransformation(
+        authority_src, authority_dst)
+    lat_first = (hasattr(authority_src, 'GetDataAxisToSRSAxisMapping')
+                 and authority_src.EPSGTreatsAsLatLong())
+    coordinates = lon_lat[:, ::-1] if lat_first else lon_lat
+    authority_points = np.array(
+        authority_transformation.TransformPoints(coordinates))
+    fast_transform = get_fast_transform(4326, epsg)
+    assert max_difference(fast_transform(coordinates),
+                          authority_points) < TOLERANCE
+    print('\tAxis order: OK')
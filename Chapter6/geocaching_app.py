@@ -1,9 +1,8 @@
 # coding=utf-8
 from osgeo import gdal
 from models import PointCollection, BoundaryCollection
+from utils.cache import CollectionCache
 from utils.geo_functions import transform_geometries, open_vector_file, transform_points
-import numpy as np
-import math
 
 
 def main():
@@ -14,17 +13,22 @@ class GeocachingApp(object):
     def __init__(self,
                  geocaching_file=None,
                  boundary_file=None,
-                 my_location=None):
+                 my_location=None,
+                 cache_dir=None):
         """Application class.
 
         :param geocaching_file: An OGR compatible file
          with geocaching points.
         :param boundary_file: A file with boundaries.
         :param my_location: Coordinates of your location.
+        :param cache_dir: A directory to cache the parsed files,
+         so later starts don't need to parse them again.
         """
-        self.geocaching_data = PointCollection(geocaching_file)
-        self.boundaries = BoundaryCollection(boundary_file)
+        cache = CollectionCache(cache_dir) if cache_dir else None
+        self.geocaching_data = PointCollection(geocaching_file, cache)
+        self.boundaries = BoundaryCollection(boundary_file, cache)
         self._my_location = None
+        self._my_coordinates = None
         if my_location:
             self.my_location = my_location
 
@@ -38,38 +42,28 @@ class GeocachingApp(object):
         self._transformed_geoms = transform_geometries(
             self._datasource, 4326, 3395)
 
-    def calculate_distances(self):
-        """Calculates the distance between a
-        set of points and a given location.
+    def calculate_distances(self, method='haversine'):
+        """Calculates the distance between the
+        geocaching points and my location.
 
-        :return: A list of distances in the same order as
-         the points.
+        :param method: 'haversine' (spherical) or 'vincenty'
+         (ellipsoidal).
+        :return: An array of distances in meters in the same
+         order as the points.
         """
-        xa = self.my_location[0]
-        ya = self.my_location[1]
-        points = self._transformed_geoms
-        distances = []
-        for geom in points:
-            vertical_distance = geom.GetY() - ya
-            horizontal_distance = geom.GetX() - xa
-            point_distance = math.sqrt(horizontal_distance ** 2 + vertical_distance ** 2)
-            distances.append(point_distance)
-        return distances
+        lon, lat = self._my_coordinates
+        return self.geocaching_data.distances_to(lon, lat, method)
 
     def find_closest_point(self):
         """Find the closest point to a given location and
         return the cache that's on that point.
 
-        :return: OGR feature containing the point.
+        :return: Geocache on that point.
         """
-        # Part 1.
-        distances = self.calculate_distances()
-        index = np.argmin(distances)
-        # Part 2.
-        layer = self._datasource.GetLayerByIndex(0)
-        feature = layer.GetFeature(index)
-        print("Closest point at: {}m".format(distances[index]))
-        return feature
+        result, distances = self.geocaching_data.nearest(
+            self._my_coordinates)
+        print("Closest point at: {}m".format(distances[0]))
+        return result.data[0]
 
     def filter_by_country(self, name):
         """Filter by a country with a given name.
@@ -86,7 +80,12 @@ class GeocachingApp(object):
 
     @my_location.setter
     def my_location(self, coordinates):
-        self._my_location = transform_points([coordinates])[0]
+        """
+        :param coordinates: Longitude and latitude.
+        """
+        self._my_coordinates = coordinates
+        self._my_location = transform_points(
+            [coordinates], traditional_gis_order=True)[0]
 
 
 if __name__ == "__main__":
@@ -95,4 +94,4 @@ if __name__ == "__main__":
     usa_boundary = my_app.boundaries.get_by_name('United States')
     result = my_app.geocaching_data.filter_by_boundary(
         usa_boundary)
-    print(result)
+    result.describe()
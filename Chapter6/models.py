@@ -1,10 +1,37 @@
 # coding=utf-8
-import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 from osgeo import gdal
-from Chapter5.utils.geo_functions import open_vector_file, transform_geometry, convert_length_unit
-from shapely.geometry import Point, mapping
-from shapely import wkb, wkt
+from utils.geo_functions import open_vector_file, transform_geometry, convert_length_unit, \
+    transform_coordinates, convert_area_unit, convert_length_units, \
+    write_vector_file, read_vector_columns, is_gpx_file, iter_batches
+from utils.areas import geodesic_areas
+from utils.geojson import write_feature_collection, \
+    write_feature_sequence, read_feature_sequence, split_byte_ranges, \
+    round_coordinates, get_encoder
+from utils.topojson import build_topology
+from utils.curves import CURVES
+from utils.distances import unit_vectors, chord_distances, distance, \
+    chord_to_meters, meters_to_chord, SPHERE_ERROR, geodesic_lengths
+import numpy as np
+import shapely
+from shapely.geometry import Point, mapping, shape
+from shapely import wkb, STRtree
+from scipy.spatial import cKDTree
+
+
+def load_geometries(values):
+    """Decodes a sequence of WKB or WKT geometries into shapely
+    geometries in a single vectorized call.
+
+    :param values: A sequence of WKB (bytes) or WKT (str) geometries.
+    :return: A NumPy array of shapely geometries.
+    """
+    values = np.asarray(values, dtype=object)
+    if len(values) and isinstance(values[0], (bytes, bytearray)):
+        return shapely.from_wkb(values)
+    return shapely.from_wkt(values)
 
 
 class BaseGeoObject(object):
@@ -24,7 +51,9 @@ class BaseGeoObject(object):
         coordinate system.
         """
         if not self.wm_geom:
-            geom = transform_geometry(self.geom.wkb)
+            # Shapely geometries are always in (lon, lat) order.
+            geom = transform_geometry(self.geom.wkb,
+                                      traditional_gis_order=True)
             self.wm_geom = wkb.loads(geom)
         return self.wm_geom
 
@@ -39,13 +68,19 @@ class BaseGeoObject(object):
             attr_name = self._attributes_lowercase[attr_name]
         return self.attributes[attr_name]
 
-    def export_geojson_feature(self):
+    def export_geojson_feature(self, precision=None):
         """Exports this object as dictionary formatted as a
          GeoJSON feature.
+
+        :param int precision: Number of decimal places to round the
+         coordinates to. None keeps the full precision.
         """
+        geometry = self.geom
+        if precision is not None:
+            geometry = round_coordinates([geometry], precision)[0]
         feature = {
             "type": "Feature",
-            "geometry": mapping(self.geom),
+            "geometry": mapping(geometry),
             "properties": self.attributes}
         return feature
 
@@ -72,62 +107,602 @@ class Boundary(BaseGeoObject):
         return self.get_attribute('name')
 
 
+class GeoList(list):
+    """A list that counts its modifications, so a collection can
+    tell when the indexes built over its data are outdated.
+    """
+    version = 0
+
+    def append(self, item):
+        self.version += 1
+        super(GeoList, self).append(item)
+
+    def extend(self, items):
+        self.version += 1
+        super(GeoList, self).extend(items)
+
+    def insert(self, index, item):
+        self.version += 1
+        super(GeoList, self).insert(index, item)
+
+    def pop(self, index=-1):
+        self.version += 1
+        return super(GeoList, self).pop(index)
+
+    def remove(self, item):
+        self.version += 1
+        super(GeoList, self).remove(item)
+
+    def clear(self):
+        self.version += 1
+        super(GeoList, self).clear()
+
+    def sort(self, *args, **kwargs):
+        self.version += 1
+        super(GeoList, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        self.version += 1
+        super(GeoList, self).reverse()
+
+    def __setitem__(self, index, value):
+        self.version += 1
+        super(GeoList, self).__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.version += 1
+        super(GeoList, self).__delitem__(index)
+
+    def __iadd__(self, items):
+        self.version += 1
+        return super(GeoList, self).__iadd__(items)
+
+    def __imul__(self, count):
+        self.version += 1
+        return super(GeoList, self).__imul__(count)
+
+
+def _import_collection(args):
+    """Imports a file into a new collection and returns its data
+    and EPSG code. Runs in the worker processes of
+    BaseGeoCollection.import_many.
+
+    :param args: A (collection class, file path) tuple.
+    """
+    collection_class, file_path = args
+    collection = collection_class(file_path)
+    return collection.data, collection.epsg
+
+
+def _geojson_to_wkb(features):
+    """Replaces the GeoJSON geometries of features, except points,
+    by WKB, so they can be parsed like the features read with OGR.
+
+    :param features: An iterable of GeoJSON feature dictionaries.
+    """
+    for feature in features:
+        geometry = feature['geometry']
+        if geometry['type'] != 'Point':
+            geometry = {'type': geometry['type'],
+                        'coordinates': shape(geometry).wkb}
+        yield {'geometry': geometry,
+               'properties': feature.get('properties') or {}}
+
+
+def _import_geojsonseq_range(args):
+    """Imports the features of a byte range of a GeoJSON text
+    sequence into a new collection and returns its data. Runs in
+    the worker processes of BaseGeoCollection.import_geojsonseq.
+
+    :param args: A (collection class, file path, start, end) tuple.
+    """
+    collection_class, file_path, start, end = args
+    collection = collection_class()
+    collection._parse_data(
+        _geojson_to_wkb(read_feature_sequence(file_path, start, end)))
+    return collection.data
+
+
 class BaseGeoCollection(object):
     """This class represents a collection of spatial data."""
 
-    def __init__(self, file_path=None):
-        self.data = []
+    # Class of the objects in the collection.
+    item_class = None
+    # Number of features rounded together when exporting.
+    export_batch_size = 10000
+
+    def __init__(self, file_path=None, cache=None):
+        """
+        :param str file_path: A file to import.
+        :param cache: An optional CollectionCache used to skip
+         parsing files that were imported before.
+        """
+        # Indexes and other values derived from the data.
+        self._derived = {}
+        self.data = self._new_data()
         self.epsg = None
+        self.cache = cache
+        # EPSG code of each imported file.
+        self.sources = {}
+        # Indexed attributes, True for the ones with sorted indexes.
+        self._indexes = {}
 
         if file_path:
             self.import_data(file_path)
 
     def __add__(self, other):
         self.data += other.data
+        self.sources.update(other.sources)
         return self
 
-    def import_data(self, file_path):
+    @property
+    def data(self):
+        """The container with the items of the collection."""
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        # The derived values belong to the replaced container.
+        self._derived.clear()
+        self._data = data
+
+    def _new_data(self):
+        """Returns the empty container used to store the data."""
+        return GeoList()
+
+    def _derive(self, name, build):
+        """Returns a value derived from the data, such as an index.
+        The value is built on first use and built again after the
+        data is modified or replaced.
+
+        :param name: A name for the value.
+        :param build: A function without arguments that builds it.
+        """
+        state = (getattr(self.data, 'version', None), len(self.data))
+        derived = self._derived.get(name)
+        if derived is None or derived[0] != state:
+            derived = (state, build())
+            self._derived[name] = derived
+        return derived[1]
+
+    def geometries(self):
+        """Returns an array with the geometries of the data."""
+        geometries = np.empty(len(self.data), dtype=object)
+        geometries[:] = [item.geom for item in self.data]
+        return geometries
+
+    def spatial_index(self):
+        """Returns an STRtree with the geometries of the data."""
+        return self._derive('spatial_index',
+                            lambda: STRtree(self.geometries()))
+
+    def _epsg_code(self, default=4326):
+        """Returns the EPSG code of the collection as an integer,
+        or a default when it isn't known.
+        """
+        try:
+            return int(self.epsg)
+        except (TypeError, ValueError):
+            return default
+
+    def transform_all(self, dst_epsg=3395):
+        """Transforms all the geometries in one batch: the
+        coordinates are gathered in one array, transformed with a
+        single call and put back into new geometries. The result is
+        kept until the data changes. When transforming into World
+        Mercator, it's also used by the objects' transformed_geom.
+
+        :param dst_epsg: EPSG code for the destination geometries.
+        :return: A NumPy array with the transformed geometries.
+        """
+        def build():
+            geometries = self.geometries()
+            coordinates = transform_coordinates(
+                shapely.get_coordinates(geometries),
+                self._epsg_code(), dst_epsg, traditional_gis_order=True)
+            return shapely.set_coordinates(geometries, coordinates)
+        transformed = self._derive('transformed:{}'.format(dst_epsg),
+                                   build)
+        # PointData builds its objects on access, so only lists
+        # have objects to update.
+        if dst_epsg == 3395 and isinstance(self.data, list):
+            for item, geometry in zip(self.data, transformed):
+                item.wm_geom = geometry
+        return transformed
+
+    def import_data(self, file_path, batch_size=None, offset=0,
+                    limit=None, fid_range=None, bbox=None):
         """Opens an vector file compatible with OGR and parses
          the data.
 
         :param str file_path: The full path to the file.
+        :param int batch_size: If given, the file is read and parsed
+         in batches of this size.
+        :param int offset: Number of features to skip.
+        :param int limit: Maximum number of features to import.
+        :param fid_range: A (first, last) tuple with the range of FIDs
+         to import. The last FID is not included.
+        :param bbox: A (xmin, ymin, xmax, ymax) tuple to import only
+         the features that intersect it. Files with a spatial index,
+         like the ones written by export, only read those features.
         """
-        features, metadata = open_vector_file(file_path)
-        self._parse_data(features)
+        # Only whole files are cached.
+        use_cache = (self.cache is not None and not offset and
+                     limit is None and not fid_range and not bbox)
+        if use_cache:
+            cached = self.cache.load(file_path, type(self).__name__)
+            if cached is not None:
+                arrays, metadata = cached
+                self._load_arrays(arrays)
+                self.epsg = metadata['epsg']
+                self.sources[file_path] = self.epsg
+                print("File imported from cache: {}".format(file_path))
+                return
+        start = len(self.data)
+        whole_layer = (not batch_size and not offset and limit is None
+                       and not fid_range)
+        if whole_layer and not is_gpx_file(file_path):
+            # Read the fields as typed columns instead of strings.
+            columns, metadata = read_vector_columns(file_path, bbox)
+            self._parse_columns(columns)
+        else:
+            features, metadata = open_vector_file(
+                file_path, batch_size=batch_size, offset=offset,
+                limit=limit, fid_range=fid_range, geometry_format='wkb',
+                bbox=bbox)
+            if batch_size:
+                for batch in features:
+                    self._parse_data(batch)
+            else:
+                self._parse_data(features)
         self.epsg = metadata['epsg']
+        self.sources[file_path] = self.epsg
+        if use_cache:
+            self.cache.store(file_path, self._dump_arrays(start),
+                             {'epsg': self.epsg}, type(self).__name__)
         print("File imported: {}".format(file_path))
 
-    def export_geojson(self, file):
-        """Exports the collection to a GeoJSON file."""
-        features = [i.export_geojson_feature() for i in self.data]
-        geojson = {"type": "FeatureCollection",
-                   "features": features}
-        with open(file, 'w') as out_file:
-            json.dump(geojson, out_file, indent=2)
+    def _dump_arrays(self, start=0):
+        """Converts the data into a list of (name, array) tuples
+        with the geometries as WKB and one array per attribute.
+
+        :param int start: Index of the first item to convert.
+        """
+        items = self.data[start:]
+        geometries = np.empty(len(items), dtype=object)
+        geometries[:] = [item.geom for item in items]
+        arrays = [('geometry', shapely.to_wkb(geometries))]
+        columns, masks = _rows_to_columns(
+            [item.attributes for item in items])
+        for name, column in columns.items():
+            arrays.append(('attribute:' + name, column))
+        for name, mask in masks.items():
+            arrays.append(('mask:' + name, mask))
+        return arrays
+
+    def _load_arrays(self, arrays):
+        """Appends the data from arrays created by _dump_arrays.
+
+        :param arrays: A dictionary of arrays.
+        """
+        geometries = load_geometries(arrays['geometry'])
+        columns = _attribute_columns(arrays)
+        masks = _attribute_columns(arrays, 'mask:')
+        for index, geometry in enumerate(geometries):
+            self.data.append(self.item_class(
+                geometry, attributes=_row_values(columns, index, masks)))
+
+    def iter_import(self, file_path, batch_size=1000):
+        """Imports a file in batches, yielding the number of
+        features imported so far after each batch. Stop iterating
+        to stop reading the file.
+
+        :param str file_path: The full path to the file.
+        :param int batch_size: Number of features in each batch.
+        """
+        features, metadata = open_vector_file(
+            file_path, batch_size=batch_size, geometry_format='wkb')
+        self.epsg = metadata['epsg']
+        self.sources[file_path] = self.epsg
+        for batch in features:
+            self._parse_data(batch)
+            yield len(self.data)
+
+    def import_many(self, paths, workers=None):
+        """Imports several files into the collection. The files
+        are parsed in parallel by a pool of processes and merged
+        in the given order.
+
+        :param paths: A list with the full paths to the files.
+        :param int workers: Number of processes. Defaults to the
+         number of CPUs.
+        :raises ValueError: If the files don't share the same EPSG
+         code as each other and the collection.
+        """
+        tasks = [(self.__class__, file_path) for file_path in paths]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_import_collection, tasks))
+        epsg = self.epsg
+        for file_path, (data, file_epsg) in zip(paths, results):
+            if epsg is not None and file_epsg != epsg:
+                raise ValueError(
+                    "The file {} uses EPSG {} instead of {}.".format(
+                        file_path, file_epsg, epsg))
+            epsg = file_epsg
+        for file_path, (data, file_epsg) in zip(paths, results):
+            self.data += data
+            self.sources[file_path] = file_epsg
+        self.epsg = epsg
+
+    def _geojson_features(self, precision=None):
+        """Yields the data as GeoJSON features.
+
+        :param int precision: Number of decimal places to round the
+         coordinates to. None keeps the full precision.
+        """
+        if precision is None:
+            for item in self.data:
+                yield item.export_geojson_feature()
+            return
+        # Round the coordinates of a batch of items together, only
+        # one batch of rounded geometries is held in memory.
+        for batch in iter_batches(self.data, self.export_batch_size):
+            geometries = round_coordinates([item.geom for item in batch],
+                                           precision)
+            for item, geometry in zip(batch, geometries):
+                yield {
+                    "type": "Feature",
+                    "geometry": mapping(geometry),
+                    "properties": item.attributes}
+
+    def export_geojson(self, file, compact=False, precision=None):
+        """Exports the collection to a GeoJSON file.
+        The features are written one at a time.
+
+        :param file: Path of the output file.
+        :param compact: True to write without indentation.
+        :param int precision: Number of decimal places to round the
+         coordinates to. None keeps the full precision.
+        """
+        features = self._geojson_features(precision)
+        with open(file, 'wb') as out_file:
+            write_feature_collection(features, out_file, compact)
         print("File exported: {}".format(file))
 
+    def export_topojson(self, file, quantization=100000,
+                        object_name=None):
+        """Exports the collection to a TopoJSON file. Coordinates
+        are quantized into delta encoded integers and the borders
+        shared by neighbouring boundaries are written once, which
+        makes the file much smaller than GeoJSON.
+
+        :param file: Path of the output file.
+        :param int quantization: Number of grid positions along each
+         axis. Higher values keep more precision.
+        :param object_name: Name of the TopoJSON object. Defaults to
+         the file name.
+        """
+        if object_name is None:
+            object_name = os.path.splitext(os.path.basename(file))[0]
+        topology = build_topology(
+            self.geometries(), [item.attributes for item in self.data],
+            object_name, quantization)
+        with open(file, 'wb') as out_file:
+            out_file.write(get_encoder(compact=True)(topology))
+        print("File exported: {}".format(file))
+
+    def export(self, file, driver=None, layer_name=None,
+               transaction_size=100000):
+        """Exports the collection to a GeoPackage or FlatGeobuf file
+        with OGR. The attributes keep their types and the file gets
+        a spatial index, so it can be read back quickly, also with
+        a bbox in import_data.
+
+        :param file: Path of the output file.
+        :param driver: 'GPKG' or 'FlatGeobuf'. Chosen from the file
+         extension (.gpkg or .fgb) if not given.
+        :param layer_name: Name of the layer. Defaults to the file name.
+        :param int transaction_size: Number of features written in
+         each transaction.
+        """
+        columns = _attribute_columns(dict(self._dump_arrays()))
+        write_vector_file(file, self.geometries(), columns,
+                          epsg=self._epsg_code(default=None),
+                          driver=driver, layer_name=layer_name,
+                          transaction_size=transaction_size)
+        print("File exported: {}".format(file))
+
+    def export_geojsonseq(self, file, precision=None):
+        """Exports the collection to a GeoJSON text sequence
+        (RFC 8142), with one feature per line.
+
+        :param file: Path of the output file.
+        :param int precision: Number of decimal places to round the
+         coordinates to. None keeps the full precision.
+        """
+        features = self._geojson_features(precision)
+        with open(file, 'wb') as out_file:
+            write_feature_sequence(features, out_file)
+        print("File exported: {}".format(file))
+
+    def import_geojsonseq(self, file_path, workers=None):
+        """Imports a GeoJSON text sequence (RFC 8142) or a
+        newline-delimited GeoJSON file. The file is split into byte
+        ranges that are parsed in parallel by a pool of processes
+        and merged in the file order.
+
+        :param str file_path: The full path to the file.
+        :param int workers: Number of processes. Defaults to the
+         number of CPUs, 1 parses the file in this process.
+        """
+        # GeoJSON coordinates are always WGS84.
+        if self.epsg is not None and str(self.epsg) != '4326':
+            raise ValueError(
+                "The file {} uses EPSG 4326 instead of {}.".format(
+                    file_path, self.epsg))
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            self._parse_data(
+                _geojson_to_wkb(read_feature_sequence(file_path)))
+        else:
+            tasks = [(self.__class__, file_path, start, end) for
+                     start, end in split_byte_ranges(file_path, workers)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for data in executor.map(_import_geojsonseq_range,
+                                         tasks):
+                    self.data += data
+        self.epsg = '4326'
+        self.sources[file_path] = self.epsg
+        print("File imported: {}".format(file_path))
+
     def _parse_data(self, features):
         raise NotImplementedError
 
+    def _parse_columns(self, columns):
+        """Appends the data from typed columns, see
+        read_vector_columns.
+
+        :param columns: A dictionary of attribute arrays and a
+         'geometry' array with WKB geometries.
+        """
+        columns = dict(columns)
+        geometries = load_geometries(columns.pop('geometry'))
+        for index, geometry in enumerate(geometries):
+            self.data.append(self.item_class(
+                geometry, attributes=_row_values(columns, index)))
+
     def describe(self):
         print("SRS EPSG code: {}".format(self.epsg))
         print("Number of features: {}".format(len(self.data)))
 
     def get_by_name(self, name):
         """Find an object by its name attribute and returns it."""
+        positions = self._lookup('name', name)
+        if not len(positions):
+            raise LookupError(
+                "Object not found with the name: {}".format(name))
+        return self.data[positions[0]]
+
+    def create_index(self, attribute, sorted_index=False):
+        """Indexes an attribute, so get_by_name and filter can find
+        its values without scanning the data. The index is built on
+        first use and rebuilt after the data changes.
+
+        :param attribute: The name of the attribute (case-insensitive).
+        :param sorted_index: True to also keep the values sorted,
+         which speeds up filter_range.
+        """
+        self._indexes[attribute.lower()] = sorted_index
+
+    def drop_index(self, attribute):
+        """Removes the index of an attribute."""
+        del self._indexes[attribute.lower()]
+
+    def _attribute_values(self, attribute):
+        """Returns a list with the values of an attribute in the
+        data order, None where it's missing.
+
+        :param attribute: The name of the attribute (case-insensitive).
+        """
+        values = []
         for item in self.data:
-            if item.get_attribute('name') == name:
-                return item
-        raise LookupError(
-            "Object not found with the name: {}".format(name))
+            try:
+                values.append(item.get_attribute(attribute))
+            except KeyError:
+                values.append(None)
+        return values
+
+    def _hash_index(self, attribute):
+        """Returns a dictionary mapping each value of an attribute
+        to the positions of the items with that value.
+        """
+        def build():
+            index = {}
+            values = self._attribute_values(attribute)
+            for position, value in enumerate(values):
+                if _is_missing(value):
+                    continue
+                try:
+                    index.setdefault(value, []).append(position)
+                except TypeError:
+                    # Unhashable values can't be indexed.
+                    continue
+            return index
+        return self._derive('hash:' + attribute.lower(), build)
+
+    def _sorted_index(self, attribute):
+        """Returns the sorted values of an attribute and the
+        positions of the items they come from.
+        """
+        def build():
+            values = self._attribute_values(attribute)
+            positions = np.array(
+                [position for position, value in enumerate(values)
+                 if not _is_missing(value)], dtype=np.int64)
+            keys = np.array([values[position] for position in positions])
+            order = np.argsort(keys, kind='stable')
+            return keys[order], positions[order]
+        return self._derive('sorted:' + attribute.lower(), build)
+
+    def _lookup(self, attribute, value):
+        """Returns the positions of the items where an attribute
+        is equal to a value, using the index if there's one.
+        """
+        if attribute.lower() in self._indexes:
+            return self._hash_index(attribute).get(value, [])
+        return [position for position, item_value in
+                enumerate(self._attribute_values(attribute))
+                if item_value == value]
+
+    def _subset(self, positions):
+        """Returns a new collection with the items at the given
+        positions.
+
+        :param positions: A sequence of positions or a boolean mask.
+        """
+        result = self.__class__()
+        result.epsg = self.epsg
+        result._indexes = dict(self._indexes)
+        for position in _as_positions(positions):
+            result.data.append(self.data[position])
+        return result
+
+    def _centroid_coordinates(self):
+        """Returns arrays with the x and y coordinates of the
+        centroids of the data.
+        """
+        centroids = shapely.centroid(self.geometries())
+        return shapely.get_x(centroids), shapely.get_y(centroids)
+
+    def sort_spatially(self, method='hilbert'):
+        """Reorders the data along a space filling curve through the
+        centroids, so items close in space are also close in the
+        data. The exporters write the data in this order, which
+        keeps later reads of an area of the exported files mostly
+        sequential. The cache keeps the order of the imported file.
+
+        :param method: 'hilbert' or 'morton'. Morton keys are faster
+         to compute, Hilbert keys keep neighbours closer together.
+        """
+        try:
+            curve = CURVES[method]
+        except KeyError:
+            raise ValueError(
+                "This method is not defined: {}".format(method))
+        keys = curve(*self._centroid_coordinates())
+        order = np.argsort(keys, kind='stable')
+        self.data = self._subset(order).data
 
     def filter_by_boundary(self, boundary):
         """Filters the data by a given boundary"""
-        result = []
-        for item in self.data:
-            if item.geom.within(boundary.geom):
-                result.append(item)
-        return result
+        tree = self.spatial_index()
+        # Select candidates by their envelopes and test only those
+        # against the prepared boundary.
+        candidates = np.sort(tree.query(boundary.geom))
+        shapely.prepare(boundary.geom)
+        inside = shapely.contains(boundary.geom,
+                                  tree.geometries.take(candidates))
+        return [self.data[index] for index in candidates[inside]]
 
     def filter(self, attribute, value):
         """Filters the collection by an attribute.
@@ -135,30 +710,535 @@ class BaseGeoCollection(object):
         :param attribute: The name of the attribute to filter by.
         :param value: The filtering value.
         """
-        result = self.__class__()
-        for item in self.data:
-            if hasattr(item, attribute) and getattr(item, attribute) == value:
-                result.data.append(item)
-        return result
+        return self._subset(self._lookup(attribute, value))
+
+    def filter_range(self, attribute, minimum=None, maximum=None):
+        """Filters the collection by a range of attribute values.
+        Both limits are included.
+
+        :param attribute: The name of the attribute to filter by.
+        :param minimum: The lowest value, None for no limit.
+        :param maximum: The highest value, None for no limit.
+        """
+        if self._indexes.get(attribute.lower()):
+            keys, positions = self._sorted_index(attribute)
+            start, end = 0, len(keys)
+            if minimum is not None:
+                start = np.searchsorted(keys, minimum, side='left')
+            if maximum is not None:
+                end = np.searchsorted(keys, maximum, side='right')
+            return self._subset(np.sort(positions[start:end]))
+        positions = []
+        for position, value in enumerate(
+                self._attribute_values(attribute)):
+            if _is_missing(value):
+                continue
+            if minimum is not None and value < minimum:
+                continue
+            if maximum is not None and value > maximum:
+                continue
+            positions.append(position)
+        return self._subset(positions)
+
+    def top_k(self, key, k, largest=True):
+        """Finds the k items with the largest (or smallest) values
+        of a key, without sorting all of them.
+
+        :param key: An array with a value for each item, a function
+         that takes the collection and returns such an array, or the
+         name of a numeric attribute.
+        :param int k: Number of items to find.
+        :param largest: False to find the smallest values instead.
+        :return: A new collection with the items and an array with
+         their values, both sorted from the first ranked.
+        """
+        if callable(key):
+            values = key(self)
+        elif isinstance(key, str):
+            values = [np.nan if _is_missing(value) else value
+                      for value in self._attribute_values(key)]
+        else:
+            values = key
+        values = np.asarray(values, dtype=np.float64)
+        k = min(k, len(values))
+        if k < 1:
+            return self._subset([]), np.empty(0)
+        ranks = -values if largest else values.copy()
+        # Missing values are ranked last.
+        ranks[np.isnan(ranks)] = np.inf
+        positions = np.argpartition(ranks, k - 1)[:k]
+        positions = positions[np.argsort(ranks[positions], kind='stable')]
+        return self._subset(positions), values[positions]
+
+
+def _to_column(values):
+    """Converts a list of attribute values into a NumPy array.
+    Integers and floats get numeric arrays, anything else is
+    stored as objects. Missing numbers are stored as NaN.
+
+    :param values: A list of values, None for missing values.
+    """
+    types = set(type(value) for value in values if value is not None)
+    if types == {int} and None not in values:
+        return np.array(values, dtype=np.int64)
+    if types and types <= {int, float}:
+        return np.array([np.nan if value is None else value
+                         for value in values], dtype=np.float64)
+    column = np.empty(len(values), dtype=object)
+    for index, value in enumerate(values):
+        column[index] = value
+    return column
+
+
+def _rows_to_columns(rows):
+    """Converts a list of attribute dictionaries into a dictionary
+    of columns. Keys missing from a row are stored as missing values
+    and, so they can be told apart from None values, the columns
+    with missing values get a mask that is True where the key is
+    present.
+
+    :param rows: A list of dictionaries.
+    :return: A (columns, masks) tuple of dictionaries.
+    """
+    names = []
+    seen = set()
+    for row in rows:
+        for name in row:
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+    columns = {}
+    masks = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        columns[name] = _to_column(values)
+        if any(_is_missing(value) for value in values):
+            masks[name] = np.array([name in row for row in rows],
+                                   dtype=bool)
+    return columns, masks
+
+
+def _present(column):
+    """Returns a mask that is True where a column without a mask
+    has a value.
+    """
+    return np.array([not _is_missing(value) for value in column],
+                    dtype=bool)
+
+
+def _missing_column(size, like):
+    """Creates a column of missing values compatible with another
+    column.
+
+    :param int size: Length of the new column.
+    :param like: The column whose type should be matched.
+    """
+    if like.dtype.kind == 'f':
+        return np.full(size, np.nan)
+    if like.dtype.kind == 'M':
+        return np.full(size, np.datetime64('NaT'), dtype=like.dtype)
+    return np.full(size, None, dtype=object)
+
+
+def _is_missing(value):
+    """Checks if a column value represents a missing value."""
+    return value is None or value != value
+
+
+def _as_positions(positions):
+    """Converts a boolean mask or a sequence of positions into
+    an array of positions.
+    """
+    positions = np.asarray(positions)
+    if positions.dtype == bool:
+        return np.flatnonzero(positions)
+    return positions.astype(np.int64)
+
+
+def _row_values(columns, index, masks=None):
+    """Returns a dictionary with the values of a row, leaving out
+    the missing values.
+
+    :param columns: A dictionary of columns.
+    :param int index: The row index.
+    :param masks: A dictionary of masks, see _rows_to_columns.
+     Columns with a mask keep the present keys even if their value
+     is None. Without one, missing values are left out.
+    """
+    values = {}
+    for name, column in columns.items():
+        value = column[index]
+        if isinstance(value, np.generic):
+            value = value.item()
+        mask = masks.get(name) if masks else None
+        if mask is None:
+            if not _is_missing(value):
+                values[name] = value
+        elif mask[index]:
+            values[name] = None if _is_missing(value) else value
+    return values
+
+
+def _attribute_columns(arrays, prefix='attribute:'):
+    """Extracts the attribute columns from arrays created by
+    BaseGeoCollection._dump_arrays.
+
+    :param arrays: A dictionary of arrays.
+    :param prefix: 'attribute:' for the columns or 'mask:' for
+     their masks.
+    """
+    return dict((name[len(prefix):], array)
+                for name, array in arrays.items()
+                if name.startswith(prefix))
+
+
+class PointData(object):
+    """Columnar storage for a collection of points.
+
+    The coordinates are kept in two float64 arrays and each attribute
+    in its own array. Geo objects are only created when the data is
+    indexed or iterated, so they are copies: changing them doesn't
+    change the stored data.
+    """
+
+    def __init__(self, x=None, y=None, columns=None, item_class=None,
+                 masks=None):
+        """
+        :param x: The x coordinates.
+        :param y: The y coordinates.
+        :param columns: A dictionary of attribute arrays.
+        :param item_class: Class of the objects created on access.
+        :param masks: A dictionary of masks, see _rows_to_columns.
+        """
+        self.item_class = item_class or Geocache
+        # Counts the modifications, see GeoList.
+        self.version = 0
+        # Appended data is kept in chunks and merged on first access.
+        self._chunks = []
+        self._rows = []
+        if x is not None:
+            self.append_columns(x, y, columns or {}, masks)
+
+    def __len__(self):
+        return (sum(len(chunk[0]) for chunk in self._chunks) +
+                len(self._rows))
+
+    def __iter__(self):
+        x, y, columns, masks = self._consolidate()
+        for index in range(len(x)):
+            yield self._make_item(x, y, columns, masks, index)
+
+    def __getitem__(self, index):
+        x, y, columns, masks = self._consolidate()
+        if isinstance(index, (int, np.integer)):
+            return self._make_item(x, y, columns, masks, index)
+        return self.take(index)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    @property
+    def x(self):
+        """Array with the x coordinates."""
+        return self._consolidate()[0]
+
+    @property
+    def y(self):
+        """Array with the y coordinates."""
+        return self._consolidate()[1]
+
+    @property
+    def columns(self):
+        """Dictionary with the attribute arrays."""
+        return self._consolidate()[2]
+
+    @property
+    def masks(self):
+        """Dictionary with the masks of the attributes missing from
+        some points, see _rows_to_columns.
+        """
+        return self._consolidate()[3]
+
+    def take(self, index):
+        """Returns a new PointData with a subset of the points.
+
+        :param index: A slice, a boolean mask or an array of indexes.
+        """
+        x, y, columns, masks = self._consolidate()
+        subset = dict((name, column[index])
+                      for name, column in columns.items())
+        mask_subset = dict((name, mask[index])
+                           for name, mask in masks.items())
+        return PointData(x[index], y[index], subset, self.item_class,
+                         mask_subset)
+
+    def append(self, item):
+        """Appends a geo object with a point geometry.
+
+        :param item: A BaseGeoObject instance.
+        """
+        self._rows.append((item.geom.x, item.geom.y, item.attributes))
+        self.version += 1
+
+    def extend(self, items):
+        """Appends the points of another PointData or an iterable
+        of geo objects.
+        """
+        if isinstance(items, PointData):
+            self.append_columns(*items._consolidate())
+        else:
+            for item in items:
+                self.append(item)
+
+    def append_columns(self, x, y, columns, masks=None):
+        """Appends points given as coordinate and attribute arrays.
+
+        :param x: The x coordinates.
+        :param y: The y coordinates.
+        :param columns: A dictionary of attribute arrays.
+        :param masks: A dictionary of masks, see _rows_to_columns.
+        """
+        self._flush_rows()
+        columns = dict(
+            (name, column if isinstance(column, np.ndarray)
+             else _to_column(list(column)))
+            for name, column in columns.items())
+        masks = dict((name, np.asarray(mask, dtype=bool))
+                     for name, mask in (masks or {}).items())
+        self.version += 1
+        self._chunks.append((np.asarray(x, dtype=np.float64),
+                             np.asarray(y, dtype=np.float64),
+                             columns, masks))
+
+    def _make_item(self, x, y, columns, masks, index):
+        return self.item_class(
+            Point(x[index], y[index]),
+            attributes=_row_values(columns, index, masks))
+
+    def _flush_rows(self):
+        """Moves the objects appended one by one into a chunk."""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        x = np.array([row[0] for row in rows], dtype=np.float64)
+        y = np.array([row[1] for row in rows], dtype=np.float64)
+        columns, masks = _rows_to_columns([row[2] for row in rows])
+        self._chunks.append((x, y, columns, masks))
+
+    def _consolidate(self):
+        """Merges all the chunks into one and returns it."""
+        self._flush_rows()
+        if not self._chunks:
+            return np.empty(0), np.empty(0), {}, {}
+        if len(self._chunks) > 1:
+            x = np.concatenate([chunk[0] for chunk in self._chunks])
+            y = np.concatenate([chunk[1] for chunk in self._chunks])
+            names = []
+            for chunk in self._chunks:
+                names += [name for name in chunk[2] if name not in names]
+            columns = {}
+            for name in names:
+                like = next(chunk[2][name] for chunk in self._chunks
+                            if name in chunk[2])
+                columns[name] = np.concatenate(
+                    [chunk[2].get(name, _missing_column(len(chunk[0]),
+                                                        like))
+                     for chunk in self._chunks])
+            masks = {}
+            for name in names:
+                if not any(name in chunk[3] for chunk in self._chunks):
+                    continue
+                masks[name] = np.concatenate(
+                    [chunk[3][name] if name in chunk[3] else
+                     _present(chunk[2][name]) if name in chunk[2] else
+                     np.zeros(len(chunk[0]), dtype=bool)
+                     for chunk in self._chunks])
+            self._chunks = [(x, y, columns, masks)]
+        return self._chunks[0]
 
 
 class PointCollection(BaseGeoCollection):
     """This class represents a collection of
-    geocaching points.
+    geocaching points. The points are stored in a
+    columnar PointData container.
     """
 
+    item_class = Geocache
+    # Number of features converted into columns at a time.
+    parse_batch_size = 10000
+
+    def _new_data(self):
+        return PointData(item_class=self.item_class)
+
+    def geometries(self):
+        return shapely.points(self.data.x, self.data.y)
+
+    def _centroid_coordinates(self):
+        return self.data.x, self.data.y
+
+    def unit_vectors(self):
+        """Returns the points as 3D unit vectors, which are kept
+        to compute great circle distances quickly.
+        """
+        return self._derive('unit_vectors', lambda: unit_vectors(
+            self.data.x, self.data.y))
+
+    def distances_to(self, lon, lat, method='haversine'):
+        """Calculates the distances in meters from every point to
+        a location, in the same order as the points.
+
+        :param lon: Longitude of the location.
+        :param lat: Latitude of the location.
+        :param method: 'haversine' (spherical) or 'vincenty'
+         (ellipsoidal).
+        """
+        if method == 'haversine':
+            return chord_distances(self.unit_vectors(), lon, lat)
+        return distance(self.data.x, self.data.y, lon, lat, method)
+
+    def point_tree(self):
+        """Returns a KD-tree of the points' unit vectors, used for
+        nearest neighbour and radius queries.
+        """
+        return self._derive('point_tree',
+                            lambda: cKDTree(self.unit_vectors()))
+
+    def nearest(self, location, k=1, method='haversine'):
+        """Finds the k points closest to a location.
+
+        :param location: Longitude and latitude of the location.
+        :param int k: Number of points to find.
+        :param method: 'haversine' (spherical) or 'vincenty'
+         (ellipsoidal).
+        :return: A PointCollection with the points and an array with
+         their distances in meters, both sorted by distance.
+        """
+        lon, lat = location
+        k = min(k, len(self.data))
+        if k < 1:
+            return self._subset([]), np.empty(0)
+        tree = self.point_tree()
+        point = unit_vectors([lon], [lat])[0]
+        chords, positions = tree.query(point, k=k)
+        chords = np.atleast_1d(chords)
+        positions = np.atleast_1d(positions)
+        if method == 'haversine':
+            return self._subset(positions), chord_to_meters(chords)
+        # The tree ranks spherical distances, so every point that
+        # could be among the k closest on the ellipsoid is checked.
+        radius = chord_to_meters(chords[-1]) * (1 + SPHERE_ERROR)
+        positions = np.array(tree.query_ball_point(
+            point, meters_to_chord(radius)), dtype=np.int64)
+        distances = distance(self.data.x[positions],
+                             self.data.y[positions], lon, lat, method)
+        order = np.argsort(distances, kind='stable')[:k]
+        return self._subset(positions[order]), distances[order]
+
+    def within_radius(self, location, meters, method='haversine'):
+        """Finds the points within a distance of a location.
+
+        :param location: Longitude and latitude of the location.
+        :param meters: The distance in meters.
+        :param method: 'haversine' (spherical) or 'vincenty'
+         (ellipsoidal).
+        :return: A PointCollection with the points and an array with
+         their distances in meters, both sorted by distance.
+        """
+        lon, lat = location
+        if method != 'haversine':
+            # Candidates come from the sphere, widen the search.
+            search_radius = meters * (1 + SPHERE_ERROR)
+        else:
+            search_radius = meters
+        point = unit_vectors([lon], [lat])[0]
+        positions = np.array(self.point_tree().query_ball_point(
+            point, meters_to_chord(search_radius)), dtype=np.int64)
+        distances = distance(self.data.x[positions],
+                             self.data.y[positions], lon, lat, method)
+        inside = distances <= meters
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return self._subset(positions[order]), distances[order]
+
+    def mask_by_boundary(self, boundary):
+        """Returns a boolean array that is True for the points
+        inside a given boundary. All the coordinates are tested
+        in one vectorized call against the prepared boundary.
+
+        :param boundary: A BaseGeoObject with a polygon geometry.
+        """
+        x, y = self.data.x, self.data.y
+        xmin, ymin, xmax, ymax = boundary.geom.bounds
+        mask = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        candidates = np.flatnonzero(mask)
+        shapely.prepare(boundary.geom)
+        mask[candidates] = shapely.contains_xy(
+            boundary.geom, x[candidates], y[candidates])
+        return mask
+
+    def filter_by_boundary(self, boundary):
+        """Filters the data by a given boundary.
+        Returns a new PointCollection with the points inside it.
+        """
+        return self._subset(self.mask_by_boundary(boundary))
+
+    def _subset(self, positions):
+        result = self.__class__()
+        result.epsg = self.epsg
+        result._indexes = dict(self._indexes)
+        result.data = self.data.take(_as_positions(positions))
+        return result
+
+    def _attribute_values(self, attribute):
+        columns = self.data.columns
+        names = dict((name.lower(), name) for name in columns)
+        if attribute.lower() not in names:
+            return [None] * len(self.data)
+        return columns[names[attribute.lower()]].tolist()
+
+    def _dump_arrays(self, start=0):
+        data = self.data.take(slice(start, None))
+        arrays = [('x', data.x), ('y', data.y)]
+        for name, column in data.columns.items():
+            arrays.append(('attribute:' + name, column))
+        for name, mask in data.masks.items():
+            arrays.append(('mask:' + name, mask))
+        return arrays
+
+    def _load_arrays(self, arrays):
+        self.data.append_columns(arrays['x'], arrays['y'],
+                                 _attribute_columns(arrays),
+                                 _attribute_columns(arrays, 'mask:'))
+
+    def _parse_columns(self, columns):
+        columns = dict(columns)
+        points = load_geometries(columns.pop('geometry'))
+        self.data.append_columns(shapely.get_x(points),
+                                 shapely.get_y(points), columns)
+
     def _parse_data(self, features):
-        """Transforms the data into Geocache objects.
+        """Transforms the data into coordinate and attribute
+        columns.
 
-        :param features: A list of features.
+        :param features: An iterable of features. Generators are
+         consumed in batches of parse_batch_size, so only one batch
+         of feature dictionaries is held in memory.
         """
-        for feature in features:
-            coords = feature['geometry']['coordinates']
-            real_coords = [float(item) for item in coords]
-            point = Point(real_coords)
-            attributes = feature['properties']
-            cache_point = Geocache(point, attributes=attributes)
-            self.data.append(cache_point)
+        for batch in iter_batches(features, self.parse_batch_size):
+            coords = [feature['geometry']['coordinates']
+                      for feature in batch]
+            # Features read with OGR carry WKB or WKT geometries.
+            if isinstance(coords[0], (str, bytes, bytearray)):
+                points = load_geometries(coords)
+                x, y = shapely.get_x(points), shapely.get_y(points)
+            else:
+                coords = np.array([coord[:2] for coord in coords],
+                                  dtype=np.float64)
+                x, y = coords[:, 0], coords[:, 1]
+            columns, masks = _rows_to_columns(
+                [feature['properties'] for feature in batch])
+            self.data.append_columns(x, y, columns, masks)
 
 
 class BoundaryCollection(BaseGeoCollection):
@@ -166,11 +1246,50 @@ class BoundaryCollection(BaseGeoCollection):
     geographic boundaries.
     """
 
+    item_class = Boundary
+
+    def areas(self, unit='km2', method='planar'):
+        """Calculates the areas of all the boundaries at once.
+        The areas are kept until the data changes.
+
+        :param unit: The desired output unit.
+        :param method: 'planar' to measure the polygons in World
+         Mercator or 'geodesic' to measure them on the ellipsoid,
+         straight from their longitudes and latitudes.
+        :return: An array of areas in the same order as the data.
+        """
+        if method == 'planar':
+            build = lambda: shapely.area(self.transform_all(3395))
+        elif method == 'geodesic':
+            build = lambda: geodesic_areas(self.geometries())
+        else:
+            raise ValueError(
+                "This area method is not defined: {}".format(method))
+        return convert_area_unit(self._derive('areas:' + method, build),
+                                 unit)
+
+    def biggest(self, k=5, unit='km2', method='planar'):
+        """Finds the k biggest boundaries by area.
+
+        :param int k: Number of boundaries to find.
+        :param unit: The unit of the returned areas.
+        :param method: 'planar' or 'geodesic', see areas.
+        :return: A new BoundaryCollection with the boundaries and an
+         array with their areas, both sorted by area.
+        """
+        return self.top_k(self.areas(unit, method), k)
+
     def _parse_data(self, features):
-        for feature in features:
-            geom = feature['geometry']['coordinates']
+        """Transforms the data into Boundary objects.
+
+        :param features: An iterable of features with WKB or WKT
+         geometries.
+        """
+        features = list(features)
+        polygons = load_geometries(
+            [feature['geometry']['coordinates'] for feature in features])
+        for feature, polygon in zip(features, polygons):
             attributes = feature['properties']
-            polygon = wkt.loads(geom)
             boundary = Boundary(geometry=polygon,
                                 attributes=attributes)
             self.data.append(boundary)
@@ -179,6 +1298,9 @@ class BoundaryCollection(BaseGeoCollection):
 class LineString(BaseGeoObject):
     """Represents a single linestring."""
 
+    # Length in meters, kept after it's first calculated.
+    length_meters = None
+
     def __repr__(self):
         unit = 'km'
         return "{}  ({}{})".format(self.get_attribute('name'),
@@ -190,18 +1312,51 @@ class LineString(BaseGeoObject):
 
         :param unit: The desired output unit.
         """
-        return convert_length_unit(self.transformed_geom().length,
-                                   unit)
+        if self.length_meters is None:
+            self.length_meters = self.transformed_geom().length
+        return convert_length_unit(self.length_meters, unit)
 
 
 class LineStringCollection(BaseGeoCollection):
     """Represents a collection of linestrings."""
 
+    item_class = LineString
+
+    def lengths(self, unit='km', method='planar'):
+        """Calculates the lengths of all the linestrings at once.
+        The lengths are kept in meters until the data changes and
+        converted to the unit on each call.
+
+        :param unit: The desired output unit.
+        :param method: 'planar' to measure the lines in World
+         Mercator, like LineString.length, or 'haversine' or
+         'vincenty' to measure them on the sphere or the ellipsoid
+         without projecting them.
+        :return: An array of lengths in the same order as the data.
+        """
+        if method == 'planar':
+            def build():
+                meters = shapely.length(self.transform_all(3395))
+                for item, length in zip(self.data, meters):
+                    item.length_meters = length
+                return meters
+        else:
+            def build():
+                return geodesic_lengths(self.geometries(), method)
+        return convert_length_units(
+            self._derive('lengths:' + method, build), unit)
+
     def _parse_data(self, features):
-        for feature in features:
-            geom = feature['geometry']['coordinates']
+        """Transforms the data into LineString objects.
+
+        :param features: An iterable of features with WKB or WKT
+         geometries.
+        """
+        features = list(features)
+        lines = load_geometries(
+            [feature['geometry']['coordinates'] for feature in features])
+        for feature, line in zip(features, lines):
             attributes = feature['properties']
-            line = wkt.loads(geom)
             linestring = LineString(geometry=line,
                                     attributes=attributes)
             self.data.append(linestring)
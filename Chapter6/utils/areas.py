@@ -0,0 +1,96 @@
+# coding=utf-8
+import numpy as np
+import shapely
+
+from utils.mercator import SEMI_MAJOR_AXIS, ECCENTRICITY
+
+
+def _authalic_q(sin_lat):
+    """The q function used to convert latitudes into authalic
+    latitudes on the WGS84 ellipsoid.
+    """
+    e = ECCENTRICITY
+    e2 = e ** 2
+    return (1 - e2) * (sin_lat / (1 - e2 * sin_lat ** 2) -
+                       np.log((1 - e * sin_lat) / (1 + e * sin_lat)) /
+                       (2 * e))
+
+
+_Q_POLE = _authalic_q(1.0)
+# Radius of the sphere with the same surface as the ellipsoid.
+AUTHALIC_RADIUS = SEMI_MAJOR_AXIS * np.sqrt(_Q_POLE / 2)
+
+
+def authalic_latitude(lat):
+    """Converts geodetic latitudes in degrees into authalic
+    latitudes in radians. Areas on the authalic sphere are equal
+    to the areas on the ellipsoid.
+    """
+    sin_lat = np.sin(np.radians(lat))
+    return np.arcsin(np.clip(_authalic_q(sin_lat) / _Q_POLE, -1, 1))
+
+
+def _ring_areas(lon, lat, ring_index, ring_count):
+    """Calculates the area of rings given as arrays of coordinates.
+
+    :param lon: Longitudes in degrees of all the rings' vertices.
+    :param lat: Latitudes in degrees of all the rings' vertices.
+    :param ring_index: The ring each vertex belongs to.
+    :param ring_count: Total number of rings.
+    :return: The area of each ring in square meters.
+    """
+    lon = np.radians(lon)
+    half_tan = np.tan(authalic_latitude(lat) / 2)
+    # Edges are pairs of consecutive vertices of the same ring.
+    same_ring = ring_index[1:] == ring_index[:-1]
+    delta_lon = np.diff(lon)[same_ring]
+    # Keep the edges crossing the antimeridian short.
+    delta_lon = (delta_lon + np.pi) % (2 * np.pi) - np.pi
+    t1, t2 = half_tan[:-1][same_ring], half_tan[1:][same_ring]
+    # Spherical excess of the area between each edge and the
+    # equator, summed for each ring.
+    excess = 2 * np.arctan(np.tan(delta_lon / 2) * (t1 + t2) /
+                           (1 + t1 * t2))
+    edge_ring = ring_index[:-1][same_ring]
+    total = np.bincount(edge_ring, weights=excess, minlength=ring_count)
+    # Rings around a pole also turn around the axis.
+    turns = np.bincount(edge_ring, weights=delta_lon,
+                        minlength=ring_count)
+    around_pole = np.abs(turns) > np.pi
+    total[around_pole] -= np.sign(turns[around_pole]) * 2 * np.pi
+    total = np.abs(total)
+    # Of the two sides of a ring, the smaller one is the inside.
+    total = np.minimum(total, 4 * np.pi - total)
+    return total * AUTHALIC_RADIUS ** 2
+
+
+def geodesic_areas(geometries):
+    """Calculates the areas of (multi)polygons in WGS84 coordinates
+    on the ellipsoid, without projecting them. The polygons are
+    mapped onto the authalic sphere, which keeps their areas, and
+    all of the vertices are processed together.
+
+    :param geometries: An array of shapely geometries with
+     (longitude, latitude) coordinates.
+    :return: An array with the areas in square meters.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    parts, geometry_index = shapely.get_parts(geometries,
+                                              return_index=True)
+    is_polygon = shapely.get_type_id(parts) == 3
+    polygons = parts[is_polygon]
+    geometry_index = geometry_index[is_polygon]
+    rings, polygon_index = shapely.get_rings(polygons, return_index=True)
+    coordinates, ring_index = shapely.get_coordinates(rings,
+                                                      return_index=True)
+    areas = _ring_areas(coordinates[:, 0], coordinates[:, 1],
+                        ring_index, len(rings))
+    # The first ring of each polygon is the exterior, the others
+    # are holes.
+    exterior = np.ones(len(rings), dtype=bool)
+    exterior[1:] = polygon_index[1:] != polygon_index[:-1]
+    areas[~exterior] *= -1
+    polygon_areas = np.bincount(polygon_index, weights=areas,
+                                minlength=len(polygons))
+    return np.bincount(geometry_index, weights=polygon_areas,
+                       minlength=len(geometries))
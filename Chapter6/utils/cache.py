@@ -0,0 +1,267 @@
+# coding=utf-8
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def _json_default(value):
+    """Encodes the dates found in JSON values, tagged so they are
+    decoded as dates again.
+    """
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(
+            type(value).__name__))
+
+
+def _json_object_hook(obj):
+    """Decodes the dates encoded by _json_default."""
+    if len(obj) == 1:
+        if '$datetime' in obj:
+            return datetime.datetime.fromisoformat(obj['$datetime'])
+        if '$date' in obj:
+            return datetime.date.fromisoformat(obj['$date'])
+    return obj
+
+
+def _is_datetime_column(values):
+    """Checks if an object column holds only dates without time
+    zone, which NumPy can store as datetime64 values.
+    """
+    present = [value for value in values if value is not None]
+    return bool(present) and all(
+        isinstance(value, datetime.datetime) and value.tzinfo is None
+        for value in present)
+
+
+def _encode_values(values):
+    """Encodes the values of an object column as bytes.
+    Returns the encoding kind and a list of bytes (None for
+    missing values).
+
+    :param values: A NumPy object array.
+    """
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, (bytes, bytearray)) for value in present):
+        return 'bytes', [None if value is None else bytes(value)
+                         for value in values]
+    if all(isinstance(value, str) for value in present):
+        kind, encode = 'str', lambda value: value.encode('utf-8')
+    else:
+        kind, encode = 'json', lambda value: json.dumps(
+            value, default=_json_default).encode('utf-8')
+    return kind, [None if value is None else encode(value)
+                  for value in values]
+
+
+def _decode_values(kind, data, offsets, valid):
+    """Rebuilds an object column from its encoded buffers.
+
+    :param kind: 'bytes', 'str' or 'json'.
+    :param data: Array with all the values concatenated.
+    :param offsets: Array with the start of each value in data.
+    :param valid: Boolean array, False for missing values.
+    """
+    buffer = memoryview(data)
+    column = np.empty(len(valid), dtype=object)
+    for index in range(len(valid)):
+        if not valid[index]:
+            continue
+        value = bytes(buffer[offsets[index]:offsets[index + 1]])
+        if kind == 'str':
+            value = value.decode('utf-8')
+        elif kind == 'json':
+            value = json.loads(value.decode('utf-8'),
+                               object_hook=_json_object_hook)
+        column[index] = value
+    return column
+
+
+def _save_column(entry, file_name, column):
+    """Writes a column to an entry directory and returns its
+    description for the entry's index.
+    """
+    path = os.path.join(entry, file_name)
+    if column.dtype == object and _is_datetime_column(column):
+        # Missing values become NaT.
+        column = column.astype('datetime64[us]')
+    if column.dtype != object:
+        np.save(path + '.npy', column)
+        return {'file': file_name, 'kind': 'array'}
+    kind, values = _encode_values(column)
+    lengths = np.array([0 if value is None else len(value)
+                        for value in values], dtype=np.int64)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    data = np.frombuffer(
+        b''.join(value for value in values if value is not None),
+        dtype=np.uint8)
+    np.save(path + '.data.npy', data)
+    np.save(path + '.offsets.npy', offsets)
+    np.save(path + '.valid.npy',
+            np.array([value is not None for value in values], dtype=bool))
+    return {'file': file_name, 'kind': kind}
+
+
+def _load_column(entry, info):
+    """Reads a column written by _save_column. Numeric columns are
+    memory-mapped instead of read into memory.
+    """
+    path = os.path.join(entry, info['file'])
+    if info['kind'] == 'array':
+        return np.load(path + '.npy', mmap_mode='r')
+    return _decode_values(info['kind'],
+                          np.load(path + '.data.npy', mmap_mode='r'),
+                          np.load(path + '.offsets.npy', mmap_mode='r'),
+                          np.load(path + '.valid.npy'))
+
+
+def _directory_size(path):
+    """Returns the total size of the files in a directory."""
+    return sum(os.path.getsize(os.path.join(path, name))
+               for name in os.listdir(path))
+
+
+class CollectionCache(object):
+    """On-disk cache of parsed collections.
+
+    Each entry stores the arrays of a collection as .npy files,
+    keyed by the path, size and modification time of the source
+    file, so a changed file is never read from the cache, and by
+    the layout of the arrays, which depends on the collection
+    class. Entries
+    used least recently are evicted when the cache exceeds its
+    size limit.
+    """
+
+    index_file = 'index.json'
+
+    def __init__(self, directory, max_size=2 * 1024 ** 3):
+        """
+        :param str directory: Where the cache entries are stored.
+        :param int max_size: Maximum size of the cache in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _key(self, file_path, layout):
+        """Builds the key of a file from its path, size,
+        modification time and the layout of its arrays.
+        """
+        stat = os.stat(file_path)
+        text = "{}|{}|{}|{}".format(os.path.abspath(file_path),
+                                    stat.st_size, stat.st_mtime, layout)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _entries(self):
+        """Lists the paths of the entries in the cache."""
+        return [os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if os.path.isfile(os.path.join(self.directory, name,
+                                               self.index_file))]
+
+    def _read_index(self, entry):
+        with open(os.path.join(entry, self.index_file)) as index_file:
+            return json.load(index_file)
+
+    def load(self, file_path, layout=None):
+        """Loads the arrays cached for a file.
+        Returns an (arrays, metadata) tuple, or None if the file
+        isn't cached with this layout or has changed since it was
+        cached.
+
+        :param str file_path: The full path to the source file.
+        :param str layout: Name of the array layout, for example
+         the collection class name.
+        """
+        entry = os.path.join(self.directory,
+                             self._key(file_path, layout))
+        if not os.path.isfile(os.path.join(entry, self.index_file)):
+            return None
+        index = self._read_index(entry)
+        if index.get('layout') != layout:
+            return None
+        arrays = dict((name, _load_column(entry, info))
+                      for name, info in index['arrays'])
+        # Mark the entry as recently used.
+        os.utime(entry, None)
+        return arrays, index['metadata']
+
+    def store(self, file_path, arrays, metadata, layout=None):
+        """Stores the arrays of a collection parsed from a file.
+        Older entries of the same file and layout are removed.
+
+        :param str file_path: The full path to the source file.
+        :param arrays: A list of (name, array) tuples.
+        :param metadata: A JSON serializable dictionary.
+        :param str layout: Name of the array layout, for example
+         the collection class name.
+        """
+        key = os.path.join(self.directory, self._key(file_path, layout))
+        source = os.path.abspath(file_path)
+        for entry in self._entries():
+            if entry == key:
+                continue
+            try:
+                index = self._read_index(entry)
+            except (IOError, OSError, ValueError):
+                # Removed or being replaced by another process.
+                continue
+            if index['source'] == source and \
+                    index.get('layout') == layout:
+                shutil.rmtree(entry, ignore_errors=True)
+        # Write to a temporary directory and move it in place, so
+        # readers never see a half written entry.
+        temp_entry = tempfile.mkdtemp(dir=self.directory)
+        try:
+            index = {'source': source, 'layout': layout,
+                     'metadata': metadata, 'arrays': []}
+            for number, (name, array) in enumerate(arrays):
+                info = _save_column(temp_entry, 'a{}'.format(number),
+                                    np.asarray(array))
+                index['arrays'].append((name, info))
+            with open(os.path.join(temp_entry, self.index_file),
+                      'w') as index_file:
+                json.dump(index, index_file)
+            try:
+                os.rename(temp_entry, key)
+            except OSError:
+                if not os.path.isfile(os.path.join(key, self.index_file)):
+                    raise
+                # Another process stored the same file first, its
+                # entry has the same contents.
+                shutil.rmtree(temp_entry, ignore_errors=True)
+        except Exception:
+            # Don't leave a partial entry behind, _evict can't see it.
+            shutil.rmtree(temp_entry, ignore_errors=True)
+            raise
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache
+        fits in its size limit.
+        """
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        sizes = dict((entry, _directory_size(entry))
+                     for entry in entries)
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+    def clear(self):
+        """Removes all the entries from the cache."""
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,93 @@
+# coding=utf-8
+import numpy as np
+
+# Bits per axis of the grid the coordinates are mapped onto.
+CURVE_BITS = 16
+
+
+def _to_grid(x, y, bbox=None, bits=CURVE_BITS):
+    """Maps coordinates onto integer cells of a 2 ** bits grid
+    covering a bounding box.
+
+    :param x: Array of x coordinates.
+    :param y: Array of y coordinates.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple. Defaults to the
+     bounds of the coordinates.
+    :param int bits: Bits per axis.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if bbox is None:
+        bbox = (np.nanmin(x), np.nanmin(y), np.nanmax(x), np.nanmax(y)) \
+            if len(x) else (0, 0, 1, 1)
+    xmin, ymin, xmax, ymax = bbox
+    cells = 2 ** bits - 1
+
+    def scale(values, low, high):
+        if high <= low:
+            return np.zeros(len(values), dtype=np.int64)
+        values = np.nan_to_num((values - low) / (high - low))
+        return np.clip(values * cells, 0, cells).astype(np.int64)
+    return scale(x, xmin, xmax), scale(y, ymin, ymax)
+
+
+def hilbert_keys(x, y, bbox=None, bits=CURVE_BITS):
+    """Calculates the position of each point along a Hilbert curve.
+    Points close to each other on the curve are close in space, and
+    the Hilbert curve has no long jumps between neighbouring cells.
+
+    :param x: Array of x coordinates.
+    :param y: Array of y coordinates.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple. Defaults to the
+     bounds of the coordinates.
+    :param int bits: Bits per axis.
+    :return: An array of integer keys.
+    """
+    x, y = _to_grid(x, y, bbox, bits)
+    keys = np.zeros(len(x), dtype=np.int64)
+    size = 2 ** bits
+    s = size // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve inside it has the
+        # standard orientation.
+        flip = ~ry & rx
+        x = np.where(flip, size - 1 - x, x)
+        y = np.where(flip, size - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s //= 2
+    return keys
+
+
+def _spread_bits(values):
+    """Inserts a zero bit before each of the lower 32 bits."""
+    values = values & 0xFFFFFFFF
+    values = (values | (values << 16)) & 0x0000FFFF0000FFFF
+    values = (values | (values << 8)) & 0x00FF00FF00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F0F0F0F0F
+    values = (values | (values << 2)) & 0x3333333333333333
+    values = (values | (values << 1)) & 0x5555555555555555
+    return values
+
+
+def morton_keys(x, y, bbox=None, bits=CURVE_BITS):
+    """Calculates the position of each point along a Morton
+    (Z-order) curve by interleaving the bits of its cell. Faster
+    than the Hilbert curve but with some long jumps.
+
+    :param x: Array of x coordinates.
+    :param y: Array of y coordinates.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple. Defaults to the
+     bounds of the coordinates.
+    :param int bits: Bits per axis.
+    :return: An array of integer keys.
+    """
+    x, y = _to_grid(x, y, bbox, bits)
+    return _spread_bits(x) | (_spread_bits(y) << 1)
+
+
+CURVES = {
+    'hilbert': hilbert_keys,
+    'morton': morton_keys}
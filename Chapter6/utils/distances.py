@@ -0,0 +1,359 @@
+# coding=utf-8
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+from utils.mercator import SEMI_MAJOR_AXIS, FLATTENING
+
+# Mean radius of the Earth (IUGG), used by the spherical formulas.
+EARTH_RADIUS = 6371008.8
+# Upper bound of the relative difference between spherical and
+# ellipsoidal distances, with some margin.
+SPHERE_ERROR = 0.01
+
+
+def unit_vectors(lon, lat):
+    """Converts coordinates into 3D unit vectors on a sphere.
+    The chord between two vectors gives the great circle distance
+    without any trigonometry, see chord_distances.
+
+    :param lon: Array of longitudes in degrees.
+    :param lat: Array of latitudes in degrees.
+    :return: An array of shape (N, 3).
+    """
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon),
+                            cos_lat * np.sin(lon),
+                            np.sin(lat)))
+
+
+def chord_to_meters(chord):
+    """Converts the length of chords of the unit sphere into
+    great circle distances in meters.
+    """
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(chord / 2, 1.0))
+
+
+def meters_to_chord(meters):
+    """Converts great circle distances in meters into chords of
+    the unit sphere.
+    """
+    return 2 * np.sin(np.minimum(meters / (2 * EARTH_RADIUS), np.pi / 2))
+
+
+def squared_chords(vectors, lon, lat):
+    """Returns the squared chords between an array of unit vectors
+    and a single location. It grows with the distance, so it's
+    enough to compare or rank distances.
+
+    :param vectors: An (N, 3) array created by unit_vectors.
+    :param lon: Longitude of the location in degrees.
+    :param lat: Latitude of the location in degrees.
+    """
+    point = unit_vectors([lon], [lat])[0]
+    result = vectors[:, 0] - point[0]
+    result *= result
+    for axis in (1, 2):
+        difference = vectors[:, axis] - point[axis]
+        difference *= difference
+        result += difference
+    return result
+
+
+def chord_distances(vectors, lon, lat):
+    """Great circle distances in meters between an array of unit
+    vectors and a single location. Equivalent to the haversine
+    formula, but much faster when the vectors are reused.
+
+    :param vectors: An (N, 3) array created by unit_vectors.
+    :param lon: Longitude of the location in degrees.
+    :param lat: Latitude of the location in degrees.
+    """
+    return chord_to_meters(np.sqrt(squared_chords(vectors, lon, lat)))
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """Great circle distances in meters with the haversine
+    formula. The arguments are broadcast against each other, so
+    they can be one location and many, or arrays shaped for a
+    many-to-many matrix.
+
+    :param lon1: Longitudes of the first locations in degrees.
+    :param lat1: Latitudes of the first locations in degrees.
+    :param lon2: Longitudes of the second locations in degrees.
+    :param lat2: Latitudes of the second locations in degrees.
+    """
+    lon1, lat1, lon2, lat2 = [np.radians(np.asarray(value, dtype=np.float64))
+                              for value in (lon1, lat1, lon2, lat2)]
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def vincenty(lon1, lat1, lon2, lat2, max_iterations=200,
+             tolerance=1e-12):
+    """Geodesic distances in meters on the WGS84 ellipsoid with
+    Vincenty's inverse formula, accurate to about half a millimetre.
+    The arguments are broadcast like in haversine. All the pairs are
+    iterated together until every one converges; nearly antipodal
+    pairs may not converge and keep their last estimate.
+
+    :param lon1: Longitudes of the first locations in degrees.
+    :param lat1: Latitudes of the first locations in degrees.
+    :param lon2: Longitudes of the second locations in degrees.
+    :param lat2: Latitudes of the second locations in degrees.
+    :param int max_iterations: Maximum number of iterations.
+    :param float tolerance: Convergence limit, in radians.
+    """
+    a = SEMI_MAJOR_AXIS
+    f = FLATTENING
+    b = a * (1 - f)
+    lon1, lat1, lon2, lat2 = np.broadcast_arrays(
+        *[np.radians(np.asarray(value, dtype=np.float64))
+          for value in (lon1, lat1, lon2, lat2)])
+    difference = lon2 - lon1
+    reduced1 = np.arctan((1 - f) * np.tan(lat1))
+    reduced2 = np.arctan((1 - f) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(reduced1), np.cos(reduced1)
+    sin_u2, cos_u2 = np.sin(reduced2), np.cos(reduced2)
+
+    lambda_ = difference
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+            sin_sigma = np.hypot(
+                cos_u2 * sin_lambda,
+                cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            # Coincident points have sin_sigma == 0.
+            sin_alpha = np.where(
+                sin_sigma == 0, 0.0,
+                cos_u1 * cos_u2 * sin_lambda / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Lines along the equator have cos2_alpha == 0.
+            cos_2sigma_m = np.where(
+                cos2_alpha == 0, 0.0,
+                cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous = lambda_
+            lambda_ = difference + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (
+                    cos_2sigma_m + c * cos_sigma *
+                    (-1 + 2 * cos_2sigma_m ** 2)))
+            if np.all(np.abs(lambda_ - previous) < tolerance):
+                break
+
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    big_b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos_2sigma_m ** 2)))
+    return b * big_a * (sigma - delta_sigma)
+
+
+# Distance formulas by name.
+METHODS = {
+    'haversine': haversine,
+    'vincenty': vincenty}
+
+
+def distance(lon1, lat1, lon2, lat2, method='haversine'):
+    """Distances in meters between locations, broadcasting the
+    arguments against each other.
+
+    :param method: 'haversine' (spherical) or 'vincenty'
+     (ellipsoidal).
+    """
+    if method not in METHODS:
+        raise ValueError(
+            "This distance method is not defined: {}".format(method))
+    return METHODS[method](lon1, lat1, lon2, lat2)
+
+
+def distance_matrix(lon1, lat1, lon2, lat2, method='haversine'):
+    """Distances in meters between every location of a first set
+    and every location of a second set.
+
+    :return: An array of shape (len(lon1), len(lon2)).
+    """
+    lon1 = np.asarray(lon1, dtype=np.float64)[:, np.newaxis]
+    lat1 = np.asarray(lat1, dtype=np.float64)[:, np.newaxis]
+    return distance(lon1, lat1, lon2, lat2, method)
+
+
+def geodesic_lengths(geometries, method='vincenty'):
+    """Calculates the lengths of (multi)linestrings in WGS84
+    coordinates without projecting them. The segments of all the
+    lines are measured together.
+
+    :param geometries: An array of shapely geometries with
+     (longitude, latitude) coordinates.
+    :param method: 'haversine' (spherical) or 'vincenty'
+     (ellipsoidal).
+    :return: An array with the lengths in meters.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    parts, geometry_index = shapely.get_parts(geometries,
+                                              return_index=True)
+    coordinates, part_index = shapely.get_coordinates(parts,
+                                                      return_index=True)
+    # Segments are pairs of consecutive vertices of the same part.
+    same_part = part_index[1:] == part_index[:-1]
+    start = coordinates[:-1][same_part]
+    end = coordinates[1:][same_part]
+    lengths = distance(start[:, 0], start[:, 1], end[:, 0], end[:, 1],
+                       method)
+    segment_geometry = geometry_index[part_index[:-1][same_part]]
+    return np.bincount(segment_geometry, weights=lengths,
+                       minlength=len(geometries))
+
+
+def _column_blocks(lon1, lat1, lon2, lat2, block_size, method):
+    """Yields (column start, block) tuples with the distances from
+    the first locations to blocks of block_size second locations.
+    """
+    lon1 = lon1[:, np.newaxis]
+    lat1 = lat1[:, np.newaxis]
+    for start in range(0, len(lon2), block_size):
+        end = start + block_size
+        yield start, distance(lon1, lat1, lon2[start:end],
+                              lat2[start:end], method)
+
+
+def _as_arrays(*values):
+    """Converts the arguments into float64 arrays."""
+    return [np.asarray(value, dtype=np.float64) for value in values]
+
+
+def iter_distance_blocks(lon1, lat1, lon2, lat2, method='haversine',
+                         block_size=1024):
+    """Yields the distance matrix between two sets of locations in
+    tiles of at most block_size by block_size, so only one tile is
+    in memory at a time.
+
+    :param method: 'haversine' (spherical) or 'vincenty'
+     (ellipsoidal).
+    :param int block_size: Number of rows and columns of a tile.
+    :return: A generator of (row start, column start, tile) tuples.
+    """
+    lon1, lat1, lon2, lat2 = _as_arrays(lon1, lat1, lon2, lat2)
+    for row_start in range(0, len(lon1), block_size):
+        row_end = row_start + block_size
+        for column_start, block in _column_blocks(
+                lon1[row_start:row_end], lat1[row_start:row_end],
+                lon2, lat2, block_size, method):
+            yield row_start, column_start, block
+
+
+def _write_row_block(args):
+    """Writes the distances of a block of rows into a memory-mapped
+    matrix. Runs in the worker processes of distance_matrix_to_file.
+    """
+    path, row_start, lon1, lat1, lon2, lat2, block_size, method = args
+    matrix = np.load(path, mmap_mode='r+')
+    row_end = row_start + len(lon1)
+    for column_start, block in _column_blocks(lon1, lat1, lon2, lat2,
+                                              block_size, method):
+        column_end = column_start + block.shape[1]
+        matrix[row_start:row_end, column_start:column_end] = block
+    matrix.flush()
+    return row_start
+
+
+def _nearest_row_block(args):
+    """Finds the k closest columns for a block of rows, merging the
+    column blocks one at a time. Runs in the worker processes of
+    nearest_distances.
+    """
+    lon1, lat1, lon2, lat2, k, block_size, method = args
+    best_distances = np.empty((len(lon1), 0))
+    best_indexes = np.empty((len(lon1), 0), dtype=np.int64)
+    for column_start, block in _column_blocks(lon1, lat1, lon2, lat2,
+                                              block_size, method):
+        indexes = np.broadcast_to(
+            np.arange(column_start, column_start + block.shape[1]),
+            block.shape)
+        best_distances = np.hstack((best_distances, block))
+        best_indexes = np.hstack((best_indexes, indexes))
+        if best_distances.shape[1] > k:
+            selection = np.argpartition(best_distances, k - 1,
+                                        axis=1)[:, :k]
+            best_distances = np.take_along_axis(best_distances,
+                                                selection, axis=1)
+            best_indexes = np.take_along_axis(best_indexes,
+                                              selection, axis=1)
+    order = np.argsort(best_distances, axis=1, kind='stable')
+    return (np.take_along_axis(best_distances, order, axis=1),
+            np.take_along_axis(best_indexes, order, axis=1))
+
+
+def _run_tasks(function, tasks, workers):
+    """Runs the tasks in a pool of processes, or in this process
+    when there's only one worker. Returns the results in order.
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, tasks))
+    return [function(task) for task in tasks]
+
+
+def distance_matrix_to_file(path, lon1, lat1, lon2, lat2,
+                            method='haversine', block_size=1024,
+                            workers=1):
+    """Writes the distance matrix between two sets of locations to
+    a .npy file, one block of rows at a time, so the matrix never
+    has to fit in memory.
+
+    :param str path: Path of the .npy file.
+    :param method: 'haversine' (spherical) or 'vincenty'
+     (ellipsoidal).
+    :param int block_size: Number of rows and columns of a tile.
+    :param int workers: Number of processes computing the blocks.
+    :return: The matrix, memory-mapped from the file.
+    """
+    lon1, lat1, lon2, lat2 = _as_arrays(lon1, lat1, lon2, lat2)
+    matrix = np.lib.format.open_memmap(path, mode='w+',
+                                       dtype=np.float64,
+                                       shape=(len(lon1), len(lon2)))
+    del matrix
+    tasks = [(path, start, lon1[start:start + block_size],
+              lat1[start:start + block_size], lon2, lat2, block_size,
+              method)
+             for start in range(0, len(lon1), block_size)]
+    _run_tasks(_write_row_block, tasks, workers)
+    return np.load(path, mmap_mode='r')
+
+
+def nearest_distances(lon1, lat1, lon2, lat2, k=1, method='haversine',
+                      block_size=1024, workers=1):
+    """For each location of a first set, finds the k closest
+    locations of a second set. The distance matrix is reduced
+    block by block, so it's never held in memory. With k=1 this is
+    the row minimum and argmin.
+
+    :param int k: Number of closest locations for each row.
+    :param method: 'haversine' (spherical) or 'vincenty'
+     (ellipsoidal).
+    :param int block_size: Number of rows and columns of a tile.
+    :param int workers: Number of processes computing the blocks.
+    :return: Two arrays of shape (N, k) with the distances and the
+     indexes of the closest locations, sorted by distance.
+    """
+    lon1, lat1, lon2, lat2 = _as_arrays(lon1, lat1, lon2, lat2)
+    k = min(k, len(lon2))
+    tasks = [(lon1[start:start + block_size],
+              lat1[start:start + block_size], lon2, lat2, k,
+              block_size, method)
+             for start in range(0, len(lon1), block_size)]
+    results = _run_tasks(_nearest_row_block, tasks, workers)
+    if not results:
+        return np.empty((0, k)), np.empty((0, k), dtype=np.int64)
+    return (np.vstack([result[0] for result in results]),
+            np.vstack([result[1] for result in results]))
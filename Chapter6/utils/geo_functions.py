@@ -1,38 +1,85 @@
 # coding=utf-8
-import xmltodict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import json
+import threading
+from xml.etree import ElementTree
 from osgeo import osr, ogr, gdal
+import numpy as np
 import os
 from pprint import pprint
+import shapely
+from utils.mercator import get_projection
+
+
+def _local_name(tag):
+    """Strips the namespace from an ElementTree tag or attribute name."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _element_to_dict(element):
+    """Converts an XML element into a dictionary following the same
+    conventions as xmltodict (attributes prefixed with '@', text-only
+    elements as strings and repeated children as lists).
+
+    :param element: An ElementTree element.
+    """
+    result = {}
+    for key, value in element.attrib.items():
+        result['@' + _local_name(key)] = value
+    for child in element:
+        name = _local_name(child.tag)
+        value = _element_to_dict(child)
+        if name not in result:
+            result[name] = value
+        elif isinstance(result[name], list):
+            result[name].append(value)
+        else:
+            result[name] = [result[name], value]
+    text = (element.text or '').strip()
+    if not result:
+        return text or None
+    if text:
+        result['#text'] = text
+    return result
 
 
 def read_gpx_file(file_path):
     """Reads a GPX file containing geocaching points.
+    The file is parsed incrementally and one feature is yielded
+    per waypoint, so memory use doesn't grow with the file size.
 
     :param str file_path: The full path to the file.
     """
-    with open(file_path) as gpx_file:
-        gpx_dict = xmltodict.parse(gpx_file.read())
-    output = []
-    for wpt in gpx_dict['gpx']['wpt']:
-        geometry = [wpt.pop('@lat'), wpt.pop('@lon')]
-        # If geocache is not on the dict, skip this wpt.
-        try:
-            geocache = wpt.pop('geocache')
-        except KeyError:
-            continue
-        attributes = {'status': geocache.pop('@status')}
-        # Merge the dictionaries.
-        attributes.update(wpt)
-        attributes.update(geocache)
-        # Construct a GeoJSON feature and append to the list.
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": geometry},
-            "properties": attributes}
-        output.append(feature)
-    return output
+    with open(file_path, 'rb') as gpx_file:
+        context = ElementTree.iterparse(gpx_file,
+                                        events=('start', 'end'))
+        _, root = next(context)
+        for event, element in context:
+            if event != 'end' or _local_name(element.tag) != 'wpt':
+                continue
+            wpt = _element_to_dict(element)
+            # Free the waypoint, it's no longer needed.
+            root.clear()
+            geometry = [wpt.pop('@lon'), wpt.pop('@lat')]
+            # If geocache is not on the dict, skip this wpt.
+            try:
+                geocache = wpt.pop('geocache')
+            except KeyError:
+                continue
+            attributes = {'status': geocache.pop('@status')}
+            # Merge the dictionaries.
+            attributes.update(wpt)
+            attributes.update(geocache)
+            # Construct a GeoJSON feature.
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": geometry},
+                "properties": attributes}
+            yield feature
 
 
 def get_datasource_information(datasource, print_results=False):
@@ -65,37 +112,289 @@ def get_datasource_information(datasource, print_results=False):
     return info
 
 
-def read_ogr_features(layer):
-    """Convert OGR features from a layer into dictionaries.
+def _export_geometry(geometry, geometry_format='wkt'):
+    """Exports an OGR geometry as WKT or WKB.
+
+    :param geometry: OGR geometry.
+    :param geometry_format: 'wkt' or 'wkb'.
+    """
+    if geometry_format == 'wkb':
+        return bytes(geometry.ExportToWkb())
+    if geometry_format == 'wkt':
+        return geometry.ExportToWkt()
+    raise ValueError(
+        "This geometry format is not defined: {}".format(geometry_format))
+
+
+def _ogr_feature_to_dict(item, layer_defn, geom_type,
+                         geometry_format='wkt'):
+    """Converts a single OGR feature into a dictionary.
+
+    :param item: OGR feature.
+    :param layer_defn: Definition of the layer the feature belongs to.
+    :param geom_type: Name of the layer geometry type.
+    :param geometry_format: 'wkt' or 'wkb'.
+    """
+    attributes = {}
+    for index in range(layer_defn.GetFieldCount()):
+        field_defn = layer_defn.GetFieldDefn(index)
+        value = _ogr_field_value(item, index, field_defn.GetType())
+        if value is None:
+            # Left out, like the missing values of read_ogr_columns.
+            continue
+        if isinstance(value, np.datetime64):
+            value = value.item()
+        elif field_defn.GetSubType() == ogr.OFSTJSON:
+            value = json.loads(value)
+        attributes[field_defn.GetName()] = value
+    feature = {
+        "type": "Feature",
+        "geometry": {
+            "type": geom_type,
+            "coordinates": _export_geometry(item.GetGeometryRef(),
+                                            geometry_format)},
+        "properties": attributes}
+    return feature
+
+
+def iter_ogr_features(layer, offset=0, limit=None, fid_range=None,
+                      geometry_format='wkt', bbox=None):
+    """Yields the OGR features from a layer as dictionaries,
+    one at a time, so the caller can stop reading at any point.
 
     :param layer: OGR layer.
+    :param int offset: Number of features to skip.
+    :param int limit: Maximum number of features to read.
+    :param fid_range: A (first, last) tuple with the range of FIDs
+     to read. The last FID is not included.
+    :param geometry_format: 'wkt' or 'wkb'.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple to read only the
+     features that intersect it. Formats with a spatial index
+     (GeoPackage, FlatGeobuf, shapefiles with .qix) use it to skip
+     the other features.
     """
-    features = []
     layer_defn = layer.GetLayerDefn()
+    geom_type = ogr.GeometryTypeToName(layer.GetGeomType())
+    if fid_range:
+        layer.SetAttributeFilter(
+            "FID >= {} AND FID < {}".format(*fid_range))
+    if bbox:
+        layer.SetSpatialFilterRect(*bbox)
+    layer.ResetReading()
+    if offset:
+        layer.SetNextByIndex(offset)
+    try:
+        count = 0
+        while limit is None or count < limit:
+            item = layer.GetNextFeature()
+            if item is None:
+                break
+            yield _ogr_feature_to_dict(item, layer_defn, geom_type,
+                                       geometry_format)
+            count += 1
+    finally:
+        if fid_range:
+            layer.SetAttributeFilter(None)
+        if bbox:
+            layer.SetSpatialFilter(None)
+
+
+def read_ogr_features(layer, geometry_format='wkt'):
+    """Convert OGR features from a layer into dictionaries.
+
+    :param layer: OGR layer.
+    :param geometry_format: 'wkt' or 'wkb'.
+    """
+    return list(iter_ogr_features(layer,
+                                  geometry_format=geometry_format))
+
+
+def _field_dtypes(layer_defn):
+    """Maps the fields of a layer to NumPy dtypes according to
+    their OGR field types.
+
+    :param layer_defn: OGR layer definition.
+    """
+    dtypes = {
+        ogr.OFTInteger: np.int32,
+        ogr.OFTInteger64: np.int64,
+        ogr.OFTReal: np.float64,
+        ogr.OFTDate: 'datetime64[ms]',
+        ogr.OFTDateTime: 'datetime64[ms]'}
+    fields = []
+    for index in range(layer_defn.GetFieldCount()):
+        field_defn = layer_defn.GetFieldDefn(index)
+        dtype = dtypes.get(field_defn.GetType(), object)
+        fields.append((field_defn.GetName(), field_defn.GetType(), dtype))
+    return fields
+
+
+def _ogr_datetime(item, index):
+    """Reads a date or date and time field as a datetime64 in UTC.
+    Values without a time zone are kept as they are.
+
+    :param item: OGR feature.
+    :param int index: The field index.
+    """
+    year, month, day, hour, minute, second, tz_flag = \
+        item.GetFieldAsDateTime(index)
+    value = (np.datetime64('{:04d}-{:02d}-{:02d}'.format(year, month, day),
+                           'ms') +
+             np.timedelta64(hour * 3600000 + minute * 60000 +
+                            int(round(second * 1000)), 'ms'))
+    # 0 is unknown and 1 is local time, the other flags are offsets
+    # from UTC in quarters of an hour, with 100 for UTC itself.
+    if tz_flag > 1:
+        value -= np.timedelta64((tz_flag - 100) * 15, 'm')
+    return value
+
+
+def _ogr_field_value(item, index, field_type):
+    """Reads a field with the type of its OGR field type. Dates are
+    returned as datetime64 values and nulls as None.
+
+    :param item: OGR feature.
+    :param int index: The field index.
+    :param field_type: The OGR field type.
+    """
+    if not item.IsFieldSetAndNotNull(index):
+        return None
+    if field_type in (ogr.OFTDate, ogr.OFTDateTime):
+        return _ogr_datetime(item, index)
+    return item.GetField(index)
+
+
+def _read_columns_by_feature(layer):
+    """Reads a layer into typed columns feature by feature.
+    Used when GDAL doesn't provide the Arrow interface.
+
+    :param layer: OGR layer.
+    """
+    fields = _field_dtypes(layer.GetLayerDefn())
+    values = dict((name, []) for name, _, _ in fields)
+    geometries = []
     layer.ResetReading()
-    type = ogr.GeometryTypeToName(layer.GetGeomType())
     for item in layer:
-        attributes = {}
-        for index in range(layer_defn.GetFieldCount()):
-            field_defn = layer_defn.GetFieldDefn(index)
-            key = field_defn.GetName()
-            value = item.GetFieldAsString(index)
-            attributes[key] = value
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": type,
-                "coordinates": item.GetGeometryRef().ExportToWkt()},
-            "properties": attributes}
-        features.append(feature)
-    return features
-
-
-def open_vector_file(file_path):
-    """Opens a vector file compatible with OGR or a GPX file.
-    Returns a list of features and information about the file.
+        for index, (name, field_type, dtype) in enumerate(fields):
+            values[name].append(_ogr_field_value(item, index, field_type))
+        geometries.append(_export_geometry(item.GetGeometryRef(), 'wkb'))
+    columns = {}
+    for name, field_type, dtype in fields:
+        column = values[name]
+        if dtype is np.float64:
+            column = [np.nan if v is None else v for v in column]
+        elif dtype in (np.int32, np.int64) and None in column:
+            # Integers can't hold nulls, promote them to floats.
+            dtype = np.float64
+            column = [np.nan if v is None else v for v in column]
+        elif dtype == 'datetime64[ms]':
+            column = [np.datetime64('NaT') if v is None else v
+                      for v in column]
+        columns[name] = np.array(column, dtype=dtype)
+    columns['geometry'] = np.array(geometries, dtype=object)
+    return columns
+
+
+def _read_arrow_columns(layer):
+    """Reads a layer into typed columns using the Arrow/NumPy
+    batch interface of GDAL 3.6+.
+
+    :param layer: OGR layer.
+    """
+    geometry_column = layer.GetGeometryColumn() or 'wkb_geometry'
+    batches = {}
+    layer.ResetReading()
+    stream = layer.GetArrowStreamAsNumPy(options=['INCLUDE_FID=NO'])
+    for batch in stream:
+        for name, array in batch.items():
+            batches.setdefault(name, []).append(array)
+    columns = {}
+    for name, arrays in batches.items():
+        column = np.concatenate(arrays)
+        if name == geometry_column:
+            name = 'geometry'
+        elif column.dtype == object:
+            column = np.array(
+                [v.decode('utf-8') if isinstance(v, bytes) else v
+                 for v in column], dtype=object)
+        columns[name] = column
+    if not columns:
+        # An empty layer yields no batches.
+        return _read_columns_by_feature(layer)
+    return columns
+
+
+def read_ogr_columns(layer):
+    """Reads all features from a layer as typed columns.
+    Returns a dictionary with a NumPy array per field, typed
+    according to the OGR field type (integers, reals and dates),
+    plus a 'geometry' array with the geometries as WKB.
+
+    :param layer: OGR layer.
+    """
+    if hasattr(layer, 'GetArrowStreamAsNumPy'):
+        columns = _read_arrow_columns(layer)
+    else:
+        columns = _read_columns_by_feature(layer)
+    # Decode the JSON fields, like the ones written by
+    # write_vector_file for dictionaries and lists.
+    layer_defn = layer.GetLayerDefn()
+    for index in range(layer_defn.GetFieldCount()):
+        field_defn = layer_defn.GetFieldDefn(index)
+        name = field_defn.GetName()
+        if field_defn.GetSubType() == ogr.OFSTJSON and name in columns:
+            column = np.empty(len(columns[name]), dtype=object)
+            column[:] = [None if value is None else json.loads(value)
+                         for value in columns[name]]
+            columns[name] = column
+    return columns
+
+
+def _read_first_layer(datasource, offset=0, limit=None,
+                      fid_range=None, geometry_format='wkt', bbox=None):
+    """Yields the features of the first layer of a datasource.
+    Holds a reference to the datasource so it isn't closed while
+    the layer is being read.
+    """
+    layer = datasource.GetLayerByIndex(0)
+    for feature in iter_ogr_features(layer, offset, limit, fid_range,
+                                     geometry_format, bbox):
+        yield feature
+
+
+def _in_bbox(features, bbox):
+    """Yields the point features inside a bounding box.
+
+    :param features: An iterable of features with coordinate lists.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple.
+    """
+    xmin, ymin, xmax, ymax = bbox
+    for feature in features:
+        x, y = feature['geometry']['coordinates'][:2]
+        if xmin <= float(x) <= xmax and ymin <= float(y) <= ymax:
+            yield feature
+
+
+def iter_batches(iterable, batch_size):
+    """Groups the items of an iterable into lists of a given size.
+    The last list may be shorter.
+
+    :param iterable: Any iterable.
+    :param int batch_size: Number of items in each list.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _open_datasource(file_path):
+    """Opens a vector file with OGR.
 
     :param str file_path: The full path to the file.
+    :raises IOError: If the file can't be opened.
     """
     datasource = ogr.Open(file_path)
     # Check if the file was opened.
@@ -106,43 +405,418 @@ def open_vector_file(file_path):
             message = "File format is invalid."
         raise IOError('Error opening the file {}\n{}'.format(
             file_path, message))
+    return datasource
+
+
+def is_gpx_file(file_path):
+    """Checks if a file is a GPX file by its extension."""
+    return os.path.splitext(file_path)[1] in ['.gpx', '.GPX']
+
+
+def read_vector_columns(file_path, bbox=None):
+    """Reads the first layer of a vector file compatible with OGR
+    as typed columns, see read_ogr_columns. Returns the columns and
+    information about the file.
+
+    :param str file_path: The full path to the file.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple to read only the
+     features that intersect it.
+    """
+    datasource = _open_datasource(file_path)
+    metadata = get_datasource_information(datasource)
+    layer = datasource.GetLayerByIndex(0)
+    if bbox:
+        layer.SetSpatialFilterRect(*bbox)
+    try:
+        columns = read_ogr_columns(layer)
+    finally:
+        if bbox:
+            layer.SetSpatialFilter(None)
+    return columns, metadata
+
+
+def open_vector_file(file_path, batch_size=None, offset=0, limit=None,
+                     fid_range=None, geometry_format='wkt', bbox=None):
+    """Opens a vector file compatible with OGR or a GPX file.
+    Returns the features and information about the file. GPX
+    features are returned as a generator.
+
+    If batch_size is given, the features are returned as a generator
+    of lists of that size instead, and the file is read as the
+    batches are consumed.
+
+    :param str file_path: The full path to the file.
+    :param int batch_size: Number of features in each batch.
+    :param int offset: Number of features to skip.
+    :param int limit: Maximum number of features to read.
+    :param fid_range: A (first, last) tuple with the range of FIDs
+     to read. The last FID is not included. For GPX files this is
+     the range of waypoint positions.
+    :param geometry_format: 'wkt' or 'wkb', the format of the
+     geometries read with OGR. WKB avoids formatting and parsing
+     text and keeps the full coordinate precision. GPX points are
+     always returned as coordinate lists.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple to read only the
+     features that intersect it, using the spatial index of the
+     file when it has one. Offset and limit apply to the features
+     inside the box.
+    """
+    datasource = _open_datasource(file_path)
     metadata = get_datasource_information(datasource)
-    file_name, file_extension = os.path.splitext(file_path)
     # Check if it's a GPX and read it if so.
-    if file_extension in ['.gpx', '.GPX']:
+    if is_gpx_file(file_path):
         features = read_gpx_file(file_path)
+        if fid_range:
+            features = islice(features, fid_range[0], fid_range[1])
+        if bbox:
+            features = _in_bbox(features, bbox)
+        if offset or limit is not None:
+            stop = offset + limit if limit is not None else None
+            features = islice(features, offset, stop)
     # If not, use OGR to get the features.
     else:
-        features = read_ogr_features(
-            datasource.GetLayerByIndex(0))
+        features = _read_first_layer(datasource, offset, limit,
+                                     fid_range, geometry_format, bbox)
+        if not batch_size:
+            features = list(features)
+    if batch_size:
+        features = iter_batches(features, batch_size)
     return features, metadata
 
 
-def create_transform(src_epsg, dst_epsg):
+# OGR drivers for writing vector files, by file extension.
+VECTOR_DRIVERS = {
+    '.gpkg': 'GPKG',
+    '.fgb': 'FlatGeobuf'}
+# Layer creation options that make each driver build a spatial index.
+SPATIAL_INDEX_OPTIONS = {
+    'GPKG': ['SPATIAL_INDEX=YES'],
+    'FlatGeobuf': ['SPATIAL_INDEX=YES']}
+# OGR geometry types for the shapely geometry type ids.
+OGR_GEOMETRY_TYPES = {
+    0: ogr.wkbPoint,
+    1: ogr.wkbLineString,
+    3: ogr.wkbPolygon,
+    4: ogr.wkbMultiPoint,
+    5: ogr.wkbMultiLineString,
+    6: ogr.wkbMultiPolygon}
+
+
+def _layer_geometry_type(geometries):
+    """Chooses the OGR geometry type of a layer for an array of
+    shapely geometries. Single and multi geometries of the same kind
+    are stored as multi geometries.
+    """
+    type_ids = set(shapely.get_type_id(geometries).tolist())
+    if len(type_ids) == 2 and max(type_ids) - min(type_ids) == 4:
+        # Promote single geometries to multi.
+        type_ids = {max(type_ids)}
+    if len(type_ids) == 1:
+        return OGR_GEOMETRY_TYPES.get(type_ids.pop(), ogr.wkbUnknown)
+    return ogr.wkbUnknown
+
+
+def _ogr_field_type(column):
+    """Chooses the OGR field type and subtype for a column.
+    Object columns holding only booleans or numbers are also
+    written as numbers, and the ones holding dictionaries or lists
+    as JSON strings.
+
+    :param column: A NumPy array.
+    :return: A (field type, subtype) tuple.
+    """
+    kind = column.dtype.kind
+    if kind == 'O':
+        types = set(type(value) for value in column
+                    if value is not None and value == value)
+        if types == {bool}:
+            kind = 'b'
+        elif types == {int}:
+            kind = 'i'
+        elif types and types <= {int, float}:
+            kind = 'f'
+        elif any(issubclass(value_type, (dict, list, tuple))
+                 for value_type in types):
+            return ogr.OFTString, ogr.OFSTJSON
+    if kind == 'b':
+        return ogr.OFTInteger, ogr.OFSTBoolean
+    if kind in 'iu':
+        if column.dtype.kind in 'iu' and column.dtype.itemsize <= 4:
+            return ogr.OFTInteger, ogr.OFSTNone
+        return ogr.OFTInteger64, ogr.OFSTNone
+    if kind == 'f':
+        return ogr.OFTReal, ogr.OFSTNone
+    if kind == 'M':
+        return ogr.OFTDateTime, ogr.OFSTNone
+    return ogr.OFTString, ogr.OFSTNone
+
+
+def write_vector_file(file_path, geometries, columns, epsg=None,
+                      driver=None, layer_name=None,
+                      transaction_size=100000):
+    """Writes geometries and their attributes to a vector file with
+    OGR, replacing the file if it exists. The fields get the types
+    of the columns and the driver builds a spatial index. Features
+    are written in transactions of transaction_size features, which
+    is much faster than a transaction per feature.
+
+    :param str file_path: The full path to the file.
+    :param geometries: An array of shapely geometries.
+    :param columns: A dictionary with the attribute columns.
+    :param epsg: EPSG code of the geometries, None if not known.
+    :param driver: Name of the OGR driver, 'GPKG' or 'FlatGeobuf'.
+     Chosen from the file extension if not given.
+    :param layer_name: Name of the layer. Defaults to the file name.
+    :param int transaction_size: Number of features in each
+     transaction.
+    """
+    file_name, file_extension = os.path.splitext(file_path)
+    if driver is None:
+        try:
+            driver = VECTOR_DRIVERS[file_extension.lower()]
+        except KeyError:
+            raise ValueError(
+                "No driver for the extension: {}".format(file_extension))
+    ogr_driver = ogr.GetDriverByName(driver)
+    if ogr_driver is None:
+        raise ValueError("This driver is not available: {}".format(driver))
+    if os.path.exists(file_path):
+        ogr_driver.DeleteDataSource(file_path)
+    datasource = ogr_driver.CreateDataSource(file_path)
+    if datasource is None:
+        raise IOError('Error creating the file {}'.format(file_path))
+    srs = get_spatial_reference(epsg) if epsg is not None else None
+    geometry_type = _layer_geometry_type(geometries)
+    layer = datasource.CreateLayer(
+        layer_name or os.path.basename(file_name), srs, geometry_type,
+        SPATIAL_INDEX_OPTIONS.get(driver, []))
+    fields = []
+    for name, column in columns.items():
+        field_type, subtype = _ogr_field_type(column)
+        field_defn = ogr.FieldDefn(name, field_type)
+        field_defn.SetSubType(subtype)
+        layer.CreateField(field_defn)
+        if field_type == ogr.OFTDateTime:
+            column = np.datetime_as_string(column, unit='ms')
+        fields.append((layer.GetLayerDefn().GetFieldIndex(name),
+                       field_type, subtype, column))
+    wkb_geometries = shapely.to_wkb(geometries)
+    use_transactions = datasource.TestCapability(ogr.ODsCTransactions)
+    layer_defn = layer.GetLayerDefn()
+    for index, geometry in enumerate(wkb_geometries):
+        if use_transactions and index % transaction_size == 0:
+            if index:
+                datasource.CommitTransaction()
+            datasource.StartTransaction()
+        feature = ogr.Feature(layer_defn)
+        for field_index, field_type, subtype, column in fields:
+            value = column[index]
+            if isinstance(value, np.generic):
+                value = value.item()
+            if (value is None or value != value or
+                    (field_type == ogr.OFTDateTime and value == 'NaT')):
+                feature.SetFieldNull(field_index)
+            elif field_type in (ogr.OFTInteger, ogr.OFTInteger64):
+                feature.SetField(field_index, int(value))
+            elif field_type == ogr.OFTReal:
+                feature.SetField(field_index, float(value))
+            elif subtype == ogr.OFSTJSON:
+                feature.SetField(field_index, json.dumps(value))
+            else:
+                feature.SetField(field_index, str(value))
+        ogr_geometry = ogr.CreateGeometryFromWkb(geometry)
+        if geometry_type != ogr.wkbUnknown:
+            ogr_geometry = ogr.ForceTo(ogr_geometry, geometry_type)
+        feature.SetGeometry(ogr_geometry)
+        layer.CreateFeature(feature)
+    if use_transactions and len(wkb_geometries):
+        datasource.CommitTransaction()
+    # Closing the datasource writes the file and its spatial index.
+    datasource = None
+
+
+# OSR objects are not thread-safe, so each thread keeps its own
+# registry of spatial references and transformations.
+_osr_registry = threading.local()
+# Maximum number of objects kept in each thread's registry.
+OSR_REGISTRY_SIZE = 64
+
+
+def _cached_osr_object(key, factory):
+    """Returns an OSR object from the current thread's registry,
+    creating it if needed. The least recently used objects are
+    dropped when the registry is full.
+
+    :param key: A hashable key for the object.
+    :param factory: A function without arguments that creates it.
+    """
+    registry = getattr(_osr_registry, 'objects', None)
+    if registry is None:
+        registry = _osr_registry.objects = OrderedDict()
+    try:
+        osr_object = registry.pop(key)
+    except KeyError:
+        osr_object = factory()
+    registry[key] = osr_object
+    while len(registry) > OSR_REGISTRY_SIZE:
+        registry.popitem(last=False)
+    return osr_object
+
+
+def get_spatial_reference(epsg, traditional_gis_order=False):
+    """Returns a cached OSR spatial reference for an EPSG code.
+
+    :param epsg: The EPSG code.
+    :param traditional_gis_order: True to always use (x, y) axis
+     order, even where the EPSG definition says otherwise.
+    """
+    def factory():
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(int(epsg))
+        if traditional_gis_order:
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        return srs
+    return _cached_osr_object(
+        ('srs', int(epsg), traditional_gis_order), factory)
+
+
+def create_transform(src_epsg, dst_epsg, traditional_gis_order=False):
     """Creates an OSR tranformation.
 
     :param src_epsg: EPSG code for the source geometry.
     :param dst_epsg: EPSG code for the destination geometry.
+    :param traditional_gis_order: True to always use (x, y) axis
+     order.
     :return: osr.CoordinateTransformation
     """
-    src_srs = osr.SpatialReference()
-    src_srs.ImportFromEPSG(src_epsg)
-    dst_srs = osr.SpatialReference()
-    dst_srs.ImportFromEPSG(dst_epsg)
+    src_srs = get_spatial_reference(src_epsg, traditional_gis_order)
+    dst_srs = get_spatial_reference(dst_epsg, traditional_gis_order)
     return osr.CoordinateTransformation(src_srs, dst_srs)
 
 
-def transform_geometries(datasource, src_epsg, dst_epsg):
+def get_transform(src_epsg, dst_epsg, traditional_gis_order=False):
+    """Returns a cached OSR transformation. Each thread gets its
+    own instance, so it's safe to use from any thread.
+
+    :param src_epsg: EPSG code for the source geometry.
+    :param dst_epsg: EPSG code for the destination geometry.
+    :param traditional_gis_order: True to always use (x, y) axis
+     order.
+    :return: osr.CoordinateTransformation
+    """
+    key = ('transform', int(src_epsg), int(dst_epsg),
+           traditional_gis_order)
+    return _cached_osr_object(key, lambda: create_transform(
+        src_epsg, dst_epsg, traditional_gis_order))
+
+
+def _is_lat_first(epsg):
+    """Checks if OSR takes the coordinates of an EPSG code with the
+    latitude first (GDAL 3 follows the axis order of the authority).
+    """
+    srs = get_spatial_reference(epsg)
+    if not hasattr(srs, 'GetDataAxisToSRSAxisMapping'):
+        return False
+    return (bool(srs.EPSGTreatsAsLatLong()) and
+            list(srs.GetDataAxisToSRSAxisMapping()) == [1, 2])
+
+
+def get_fast_transform(src_epsg, dst_epsg, traditional_gis_order=False):
+    """Returns a function that transforms an (N, 2) array of
+    coordinates with NumPy instead of OSR, or None if there's no
+    NumPy implementation for the EPSG codes. The coordinates use
+    the same axis order as OSR.
+
+    :param src_epsg: EPSG code for the source coordinates.
+    :param dst_epsg: EPSG code for the destination coordinates.
+    :param traditional_gis_order: True if the coordinates are always
+     in (x, y) order, like the ones of shapely geometries.
+    """
+    projection = get_projection(src_epsg, dst_epsg)
+    if projection is None:
+        return None
+    lat_first = not traditional_gis_order and _is_lat_first(src_epsg)
+
+    def transform(coordinates):
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+        if lat_first:
+            x, y = projection(coordinates[:, 1], coordinates[:, 0])
+        else:
+            x, y = projection(coordinates[:, 0], coordinates[:, 1])
+        return np.column_stack((x, y))
+    return transform
+
+
+def _read_geometry_chunks(layer, chunk_size):
+    """Yields copies of the geometries of a layer in lists of
+    chunk_size, following the FID order.
+    """
+    chunk = []
+    layer.ResetReading()
+    for feature in layer:
+        chunk.append(feature.GetGeometryRef().Clone())
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _transform_chunk(geoms, src_epsg, dst_epsg):
+    """Transforms a list of OGR geometries in place. Runs in the
+    thread pool, using the thread's own transformation.
+    """
+    transformation = get_transform(src_epsg, dst_epsg)
+    for geom in geoms:
+        geom.Transform(transformation)
+    return geoms
+
+
+def iter_transformed_geometries(datasource, src_epsg, dst_epsg,
+                                workers=4, chunk_size=10000):
+    """Yields the transformed geometries of the first layer in
+    lists of chunk_size, in FID order. The layer is read in the
+    calling thread and the chunks are transformed in a pool of
+    threads (OGR releases the GIL while transforming). Only a few
+    chunks are held in memory at a time.
+
+    :param datasource: An OGR datasource.
+    :param src_epsg: EPSG code for the source geometries.
+    :param dst_epsg: EPSG code for the destination geometries.
+    :param int workers: Number of threads.
+    :param int chunk_size: Number of geometries in each chunk.
+    """
+    layer = datasource.GetLayerByIndex(0)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in _read_geometry_chunks(layer, chunk_size):
+            pending.append(executor.submit(_transform_chunk, chunk,
+                                           src_epsg, dst_epsg))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def transform_geometries(datasource, src_epsg, dst_epsg, workers=1,
+                         chunk_size=10000):
     """Transform the coordinates of all geometries in
     the first layer.
+
+    :param int workers: Number of threads used to transform the
+     geometries.
+    :param int chunk_size: Number of geometries transformed by a
+     thread at a time.
     """
+    if workers > 1:
+        geoms = []
+        for chunk in iter_transformed_geometries(
+                datasource, src_epsg, dst_epsg, workers, chunk_size):
+            geoms.extend(chunk)
+        return geoms
 
     # Part 1
-    src_srs = osr.SpatialReference()
-    src_srs.ImportFromEPSG(src_epsg)
-    dst_srs = osr.SpatialReference()
-    dst_srs.ImportFromEPSG(dst_epsg)
-    transformation = osr.CoordinateTransformation(src_srs, dst_srs)
+    transformation = get_transform(src_epsg, dst_epsg)
     layer = datasource.GetLayerByIndex(0)
 
     # Part 2
@@ -155,37 +829,87 @@ def transform_geometries(datasource, src_epsg, dst_epsg):
     return geoms
 
 
-def transform_points(points, src_epsg=4326, dst_epsg=3395):
+def transform_points(points, src_epsg=4326, dst_epsg=3395,
+                     traditional_gis_order=False):
     """Transform the coordinate reference system of a list of coordinates (a list of points)
 
      :param points:
      :param src_epsg: EPSG code for the source geometry.
      :param dst_epsg: EPSG code for the destination geometry.
+     :param traditional_gis_order: True if the points are in
+      (x, y) order, (longitude, latitude) for geographic ones.
      """
-    transform = create_transform(src_epsg, dst_epsg)
+    fast_transform = get_fast_transform(src_epsg, dst_epsg,
+                                        traditional_gis_order)
+    if fast_transform:
+        points = np.asarray(points, dtype=np.float64)
+        if points.shape[1] > 2:
+            z = points[:, 2]
+        else:
+            z = np.zeros(len(points))
+        result = np.column_stack((fast_transform(points[:, :2]), z))
+        return [tuple(point) for point in result.tolist()]
+    transform = get_transform(src_epsg, dst_epsg, traditional_gis_order)
     points = transform.TransformPoints(points)
     return points
 
 
-def transform_geometry(geom, src_epsg=4326, dst_epsg=3395):
+def transform_coordinates(coordinates, src_epsg=4326, dst_epsg=3395,
+                          traditional_gis_order=False):
+    """Transforms an array of coordinates with a single call.
+
+    :param coordinates: An array of shape (N, 2).
+    :param src_epsg: EPSG code for the source coordinates.
+    :param dst_epsg: EPSG code for the destination coordinates.
+    :param traditional_gis_order: True if the coordinates are in
+     (x, y) order, (longitude, latitude) for geographic ones, like
+     the ones returned by shapely.get_coordinates.
+    :return: A float64 array of shape (N, 2).
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    if not len(coordinates):
+        return np.empty((0, 2))
+    fast_transform = get_fast_transform(src_epsg, dst_epsg,
+                                        traditional_gis_order)
+    if fast_transform:
+        return fast_transform(coordinates[:, :2])
+    transform = get_transform(src_epsg, dst_epsg, traditional_gis_order)
+    points = transform.TransformPoints(coordinates[:, :2])
+    return np.array(points, dtype=np.float64)[:, :2]
+
+
+def transform_geometry(geom, src_epsg=4326, dst_epsg=3395,
+                       traditional_gis_order=False):
     """Transforms a single wkb geometry.
 
     :param geom: wkb geom.
     :param src_epsg: EPSG code for the source geometry.
     :param dst_epsg: EPSG code for the destination geometry.
+    :param traditional_gis_order: True if the geometry is in
+     (x, y) order, like the ones exported from shapely.
     """
+    fast_transform = get_fast_transform(src_epsg, dst_epsg,
+                                        traditional_gis_order)
+    if fast_transform:
+        return shapely.to_wkb(
+            shapely.transform(shapely.from_wkb(geom), fast_transform))
     ogr_geom = ogr.CreateGeometryFromWkb(geom)
-    ogr_transformation = create_transform(src_epsg, dst_epsg)
+    ogr_transformation = get_transform(src_epsg, dst_epsg,
+                                       traditional_gis_order)
     ogr_geom.Transform(ogr_transformation)
     return ogr_geom.ExportToWkb()
 
 
+# Square meters in each area unit.
+AREA_UNITS = {
+    'sqmi': 2589988.11,
+    'km2': 1000000,
+    'm': 1}
+
+
 def calculate_areas(geometries, unity='km2'):
     """Calculate the area for a list of ogr geometries."""
-    conversion_factor = {
-        'sqmi': 2589988.11,
-        'km2': 1000000,
-        'm': 1}
+    conversion_factor = AREA_UNITS
     if unity not in conversion_factor:
         raise ValueError(
             "This unity is not defined: {}".format(unity))
@@ -196,6 +920,26 @@ def calculate_areas(geometries, unity='km2'):
     return areas
 
 
+def convert_area_unit(values, unit='km2'):
+    """Convert an array of areas in square meters into
+    another unit.
+
+    :param values: Input values in square meters.
+    :param unit: The desired output unit.
+    """
+    if unit not in AREA_UNITS:
+        raise ValueError(
+            "This unit is not defined: {}".format(unit))
+    return np.asarray(values) / AREA_UNITS[unit]
+
+
+# Each length unit in meters.
+LENGTH_UNITS = {
+    'mi': 0.000621371192,
+    'km': 0.001,
+    'm': 1.0}
+
+
 def convert_length_unit(value, unit='km', decimal_places=2):
     """Convert the leng unit of a given value.
      The input is in meters and the output is set by the unity
@@ -205,10 +949,7 @@ def convert_length_unit(value, unit='km', decimal_places=2):
     :param unit: The desired output unit.
     :param decimal_places: Number of decimal places of the output.
     """
-    conversion_factor = {
-        'mi': 0.000621371192,
-        'km': 0.001,
-        'm': 1.0}
+    conversion_factor = LENGTH_UNITS
 
     if unit not in conversion_factor:
         raise ValueError(
@@ -216,6 +957,18 @@ def convert_length_unit(value, unit='km', decimal_places=2):
     return round(value * conversion_factor[unit], decimal_places)
 
 
+def convert_length_units(values, unit='km'):
+    """Convert an array of lengths in meters into another unit.
+
+    :param values: Input values in meters.
+    :param unit: The desired output unit.
+    """
+    if unit not in LENGTH_UNITS:
+        raise ValueError(
+            "This unit is not defined: {}".format(unit))
+    return np.asarray(values) * LENGTH_UNITS[unit]
+
+
 if __name__ == "__main__":
     gdal.PushErrorHandler('CPLQuietErrorHandler')
     points, metadata = open_vector_file(
@@ -223,4 +976,4 @@ if __name__ == "__main__":
     print(points[0]['properties'].keys())
     points, metadata = open_vector_file(
         "../../data/geocaching.gpx")
-    print(points[0]['properties'].keys())
+    print(next(points)['properties'].keys())
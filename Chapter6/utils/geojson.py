@@ -0,0 +1,150 @@
+# coding=utf-8
+import datetime
+import json
+import os
+import textwrap
+
+import numpy as np
+import shapely
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(obj):
+    """Encodes the dates read from typed fields as ISO 8601 strings,
+    as orjson does.
+    """
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(
+            type(obj).__name__))
+
+
+def get_encoder(compact=False):
+    """Returns a function that encodes an object as JSON bytes.
+    Uses orjson when it's installed, which is much faster than the
+    json module.
+
+    :param compact: True to leave out all the whitespace, False to
+     indent with two spaces.
+    """
+    if orjson is not None:
+        option = 0 if compact else orjson.OPT_INDENT_2
+        return lambda obj: orjson.dumps(obj, option=option)
+    if compact:
+        return lambda obj: json.dumps(
+            obj, separators=(',', ':'),
+            default=_json_default).encode('utf-8')
+    return lambda obj: json.dumps(
+        obj, indent=2, default=_json_default).encode('utf-8')
+
+
+def round_coordinates(geometries, precision):
+    """Rounds the coordinates of geometries to a number of decimal
+    places, all of them in one call. Rounded coordinates are encoded
+    with fewer digits, 6 decimal places of degrees are about 10cm.
+
+    :param geometries: An array of shapely geometries.
+    :param int precision: Number of decimal places.
+    :return: A new array with the rounded geometries.
+    """
+    geometries = np.array(geometries, dtype=object)
+    coordinates = np.round(shapely.get_coordinates(geometries), precision)
+    return shapely.set_coordinates(geometries, coordinates)
+
+
+def write_feature_collection(features, out_file, compact=False):
+    """Writes features to a file as a GeoJSON FeatureCollection,
+    one feature at a time, so the whole document is never held in
+    memory.
+
+    :param features: An iterable of GeoJSON feature dictionaries.
+    :param out_file: A file opened for writing in binary mode.
+    :param compact: True to leave out all the whitespace.
+    """
+    encode = get_encoder(compact)
+    if compact:
+        header, separator, footer = (
+            b'{"type":"FeatureCollection","features":[', b',', b']}')
+    else:
+        header = b'{\n  "type": "FeatureCollection",\n  "features": ['
+        separator = b','
+        footer = b'\n  ]\n}'
+    out_file.write(header)
+    first = True
+    for feature in features:
+        if not first:
+            out_file.write(separator)
+        first = False
+        if compact:
+            out_file.write(encode(feature))
+        else:
+            text = encode(feature).decode('utf-8')
+            out_file.write(b'\n')
+            out_file.write(
+                textwrap.indent(text, '    ').encode('utf-8'))
+    if first and not compact:
+        # No features, close the list on the same line.
+        footer = b']\n}'
+    out_file.write(footer)
+
+
+# Record separator that starts each text of a GeoJSON text sequence.
+RECORD_SEPARATOR = b'\x1e'
+
+
+def write_feature_sequence(features, out_file):
+    """Writes features to a file as a GeoJSON text sequence
+    (RFC 8142): one compact feature per line, each starting with
+    a record separator.
+
+    :param features: An iterable of GeoJSON feature dictionaries.
+    :param out_file: A file opened for writing in binary mode.
+    """
+    encode = get_encoder(compact=True)
+    for feature in features:
+        out_file.write(RECORD_SEPARATOR)
+        out_file.write(encode(feature))
+        out_file.write(b'\n')
+
+
+def read_feature_sequence(file_path, start=0, end=None):
+    """Reads the features of a GeoJSON text sequence, or of a plain
+    newline-delimited GeoJSON file. Only the lines that begin in
+    the byte range [start, end) are read, so a file can be split
+    into ranges that are read separately.
+
+    :param str file_path: The full path to the file.
+    :param int start: First byte of the range.
+    :param int end: End of the range, None for the end of the file.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(file_path, 'rb') as in_file:
+        if start > 0:
+            # The line running over start belongs to the range before.
+            in_file.seek(start - 1)
+            in_file.readline()
+        while end is None or in_file.tell() < end:
+            line = in_file.readline()
+            if not line:
+                break
+            line = line.strip().lstrip(RECORD_SEPARATOR)
+            if line:
+                yield loads(line)
+
+
+def split_byte_ranges(file_path, count):
+    """Splits a file into byte ranges of about the same size.
+
+    :param str file_path: The full path to the file.
+    :param int count: Number of ranges.
+    :return: A list of (start, end) tuples.
+    """
+    size = os.path.getsize(file_path)
+    bounds = [size * index // count for index in range(count + 1)]
+    return [(bounds[index], bounds[index + 1]) for index in range(count)
+            if bounds[index] < bounds[index + 1]]
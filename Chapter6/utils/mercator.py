@@ -0,0 +1,58 @@
+# coding=utf-8
+import numpy as np
+
+# WGS84 ellipsoid.
+SEMI_MAJOR_AXIS = 6378137.0
+FLATTENING = 1 / 298.257223563
+ECCENTRICITY = np.sqrt(FLATTENING * (2 - FLATTENING))
+
+
+def world_mercator(lon, lat):
+    """Projects WGS84 coordinates into World Mercator (EPSG:3395)
+    using the ellipsoidal Mercator equations.
+
+    :param lon: Array of longitudes in degrees.
+    :param lat: Array of latitudes in degrees.
+    :return: Arrays with the x and y coordinates in meters.
+    """
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    sin_lat = np.sin(np.radians(np.asarray(lat, dtype=np.float64)))
+    with np.errstate(divide='ignore'):
+        y = SEMI_MAJOR_AXIS * (np.arctanh(sin_lat) -
+                               ECCENTRICITY *
+                               np.arctanh(ECCENTRICITY * sin_lat))
+    return SEMI_MAJOR_AXIS * lon, y
+
+
+def web_mercator(lon, lat):
+    """Projects WGS84 coordinates into Web Mercator (EPSG:3857),
+    which uses the spherical Mercator equations.
+
+    :param lon: Array of longitudes in degrees.
+    :param lat: Array of latitudes in degrees.
+    :return: Arrays with the x and y coordinates in meters.
+    """
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    sin_lat = np.sin(np.radians(np.asarray(lat, dtype=np.float64)))
+    with np.errstate(divide='ignore'):
+        y = SEMI_MAJOR_AXIS * np.arctanh(sin_lat)
+    return SEMI_MAJOR_AXIS * lon, y
+
+
+# Projections available for (source, destination) EPSG pairs.
+PROJECTIONS = {
+    (4326, 3395): world_mercator,
+    (4326, 3857): web_mercator}
+
+
+def get_projection(src_epsg, dst_epsg):
+    """Returns the NumPy projection function for a pair of EPSG
+    codes, or None if there isn't one.
+
+    :param src_epsg: EPSG code for the source coordinates.
+    :param dst_epsg: EPSG code for the destination coordinates.
+    """
+    try:
+        return PROJECTIONS.get((int(src_epsg), int(dst_epsg)))
+    except (TypeError, ValueError):
+        return None
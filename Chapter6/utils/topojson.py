@@ -0,0 +1,249 @@
+# coding=utf-8
+import numpy as np
+import shapely
+
+
+def quantize(coordinates, bbox, quantization):
+    """Converts coordinates into integers on a grid of quantization
+    by quantization cells covering the bounding box.
+
+    :param coordinates: An (N, 2) array of coordinates.
+    :param bbox: A (xmin, ymin, xmax, ymax) tuple.
+    :param int quantization: Number of grid positions along each axis.
+    :return: The integer coordinates and the TopoJSON transform that
+     converts them back.
+    """
+    xmin, ymin, xmax, ymax = bbox
+    scale = [(xmax - xmin) / (quantization - 1) if xmax > xmin else 1.0,
+             (ymax - ymin) / (quantization - 1) if ymax > ymin else 1.0]
+    translate = [xmin, ymin]
+    quantized = np.round((coordinates - translate) / scale)
+    transform = {'scale': scale, 'translate': translate}
+    return quantized.astype(np.int64), transform
+
+
+def _drop_repeated(points, closed):
+    """Removes the consecutive repeated points of a line, which
+    appear when nearby points fall in the same grid cell.
+
+    :param points: An (N, 2) array of integer coordinates.
+    :param closed: True if the line is a ring.
+    :return: An (array, closed) tuple.
+    """
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[keep]
+    if closed and len(points) == 1:
+        # A ring that collapsed into a point still ends where it
+        # starts.
+        points = np.concatenate((points, points))
+    return points, closed
+
+
+def _find_junctions(keys, closed):
+    """Finds the points where lines meet or split. A point is a
+    junction when it's the end of an open line or when it's
+    reached with different neighbours, for example where the border
+    between two countries meets a third one.
+
+    :param keys: A list with an array of point keys for each line.
+    :param closed: A list with True for the lines that are rings.
+    :return: An array with the keys of the junctions.
+    """
+    points, low, high, ends = [], [], [], []
+    for line_keys, is_closed in zip(keys, closed):
+        if is_closed:
+            # The last point of a ring repeats the first one.
+            line_keys = line_keys[:-1]
+            previous = np.roll(line_keys, 1)
+            following = np.roll(line_keys, -1)
+        else:
+            previous = np.concatenate(([-1], line_keys[:-1]))
+            following = np.concatenate((line_keys[1:], [-1]))
+            ends.extend((line_keys[0], line_keys[-1]))
+        points.append(line_keys)
+        # Neighbours are unordered, so a ring shared in the other
+        # direction has the same ones.
+        low.append(np.minimum(previous, following))
+        high.append(np.maximum(previous, following))
+    if not points:
+        return np.empty(0, dtype=np.int64)
+    visits = np.unique(np.column_stack((np.concatenate(points),
+                                        np.concatenate(low),
+                                        np.concatenate(high))), axis=0)
+    point_keys, counts = np.unique(visits[:, 0], return_counts=True)
+    return np.union1d(point_keys[counts > 1],
+                      np.array(ends, dtype=np.int64))
+
+
+def _cut_line(points, keys, is_closed, junctions):
+    """Splits a line into arcs at its junctions. Rings without
+    junctions are kept whole, starting at their smallest point so
+    the same ring always gives the same arc.
+
+    :return: A list of arrays of points.
+    """
+    is_junction = np.isin(keys, junctions)
+    if not is_closed:
+        cuts = np.flatnonzero(is_junction[1:-1]) + 1
+        bounds = [0] + cuts.tolist() + [len(points) - 1]
+        return [points[start:stop + 1]
+                for start, stop in zip(bounds[:-1], bounds[1:])]
+    ring, ring_keys = points[:-1], keys[:-1]
+    cuts = np.flatnonzero(is_junction[:-1])
+    first = cuts[0] if len(cuts) else np.argmin(ring_keys)
+    ring = np.roll(ring, -first, axis=0)
+    ring = np.concatenate((ring, ring[:1]))
+    if len(cuts):
+        bounds = (cuts - first).tolist() + [len(ring) - 1]
+    else:
+        bounds = [0, len(ring) - 1]
+    return [ring[start:stop + 1]
+            for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+class ArcIndex(object):
+    """Stores each distinct arc once. An arc found again in the
+    opposite direction is referenced with its one's complement,
+    as TopoJSON does.
+    """
+
+    def __init__(self):
+        self.arcs = []
+        self._positions = {}
+
+    def add(self, arc):
+        """Returns the reference to an arc, adding it if it's new.
+
+        :param arc: An (N, 2) array of integer coordinates.
+        """
+        key = arc.tobytes()
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+        position = self._positions.get(arc[::-1].tobytes())
+        if position is not None:
+            return ~position
+        position = len(self.arcs)
+        self.arcs.append(arc)
+        self._positions[key] = position
+        return position
+
+    def encode(self):
+        """Returns the arcs as lists of delta encoded positions:
+        the first position of each arc is absolute and the others
+        are relative to the previous one.
+        """
+        encoded = []
+        for arc in self.arcs:
+            deltas = arc.copy()
+            deltas[1:] -= arc[:-1]
+            encoded.append(deltas.tolist())
+        return encoded
+
+
+def _geometry_lines(geometry):
+    """Returns the parts of a geometry as a nested list matching the
+    TopoJSON structure, with an (array, closed) tuple for each line.
+    """
+    geometry_type = geometry.geom_type
+    if geometry_type == 'LineString':
+        return (np.asarray(geometry.coords)[:, :2], False)
+    if geometry_type == 'Polygon':
+        return [(np.asarray(ring.coords)[:, :2], True)
+                for ring in [geometry.exterior] + list(geometry.interiors)]
+    if geometry_type in ('MultiLineString', 'MultiPolygon'):
+        return [_geometry_lines(part) for part in geometry.geoms]
+    raise ValueError(
+        "This geometry type has no arcs: {}".format(geometry_type))
+
+
+def _map_lines(nested, function):
+    """Applies a function to the (array, closed) tuples of a nested
+    list returned by _geometry_lines.
+    """
+    if isinstance(nested, tuple):
+        return function(*nested)
+    return [_map_lines(item, function) for item in nested]
+
+
+def _flatten_lines(nested):
+    """Yields the (array, closed) tuples of a nested list."""
+    if isinstance(nested, tuple):
+        yield nested
+    else:
+        for item in nested:
+            for line in _flatten_lines(item):
+                yield line
+
+
+def build_topology(geometries, properties, object_name='data',
+                   quantization=100000):
+    """Builds a TopoJSON topology from shapely geometries.
+    Coordinates are quantized into integers and lines are split into
+    arcs at their junctions, so the borders shared by neighbouring
+    polygons are stored only once. Arcs are delta encoded.
+
+    :param geometries: An array of shapely geometries.
+    :param properties: A list with the properties of each geometry.
+    :param object_name: Name of the object holding the geometries.
+    :param int quantization: Number of grid positions along each axis.
+    :return: A dictionary with the topology.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    bbox = shapely.total_bounds(geometries).tolist()
+    if not np.all(np.isfinite(bbox)):
+        bbox = [0.0, 0.0, 0.0, 0.0]
+    coordinates, transform = quantize(shapely.get_coordinates(geometries),
+                                      bbox, quantization)
+    geometries = shapely.set_coordinates(geometries.copy(),
+                                         coordinates.astype(np.float64))
+    # Each point of the grid gets an integer key, -1 is left for
+    # the missing neighbours of line ends.
+    width = np.int64(coordinates.max() + 1) if len(coordinates) else 1
+
+    lines = []
+    for geometry in geometries:
+        if geometry is None or geometry.is_empty or \
+                geometry.geom_type in ('Point', 'MultiPoint'):
+            lines.append(None)
+            continue
+        lines.append(_map_lines(
+            _geometry_lines(geometry),
+            lambda points, closed: _drop_repeated(
+                points.astype(np.int64), closed)))
+
+    def point_keys(points):
+        return points[:, 0] * width + points[:, 1]
+    flat = [line for nested in lines if nested is not None
+            for line in _flatten_lines(nested)]
+    junctions = _find_junctions([point_keys(points) for points, _ in flat],
+                                [closed for _, closed in flat])
+
+    arc_index = ArcIndex()
+
+    def line_arcs(points, closed):
+        return [arc_index.add(arc) for arc in _cut_line(
+            points, point_keys(points), closed, junctions)]
+    objects = []
+    for geometry, nested, attributes in zip(geometries, lines, properties):
+        if geometry is None or geometry.is_empty:
+            topology_object = {'type': None}
+        elif nested is None:
+            points = shapely.get_coordinates(geometry).astype(np.int64)
+            if geometry.geom_type == 'Point':
+                points = points[0]
+            topology_object = {'type': geometry.geom_type,
+                               'coordinates': points.tolist()}
+        else:
+            topology_object = {'type': geometry.geom_type,
+                               'arcs': _map_lines(nested, line_arcs)}
+        topology_object['properties'] = attributes
+        objects.append(topology_object)
+    return {
+        'type': 'Topology',
+        'bbox': bbox,
+        'transform': transform,
+        'objects': {object_name: {'type': 'GeometryCollection',
+                                  'geometries': objects}},
+        'arcs': arc_index.encode()}